@@ -14,6 +14,7 @@ import yaml
 from radiome.core import __version__, __author__, __email__
 from radiome.core import context
 from radiome.core.execution import pipeline
+from radiome.core.execution.cache import ResultCache
 from radiome.core.utils.s3 import S3Resource
 
 
@@ -83,6 +84,28 @@ def parse_args(args):
                         help='Disable file logging, this is useful for clusters that have disabled file locking.')
     parser.add_argument('--diagnostics', action='store_true',
                         help='Enable diagnostics dashboard of execution engine.')
+    parser.add_argument('--executor', choices=list(pipeline.executors), default='dask',
+                        help='Execution engine: "serial" runs one job at a time, "local" runs jobs in parallel '
+                             'in a local process pool, within --n_cpus and the memory limit, and "dask" runs '
+                             'jobs on a local Dask cluster.')
+    parser.add_argument('--cache_dir', help='Directory of the result cache. When set, the results of jobs are kept '
+                                            'across runs, and jobs which did not change are not computed again.')
+    parser.add_argument('--cache_size_gb', type=float, default=50,
+                        help='Size limit of the result cache in gigabytes, beyond which the least recently used '
+                             'results are evicted.')
+    parser.add_argument('--clear_cache', action='store_true',
+                        help='Remove the results in the result cache before running.')
+    parser.add_argument('--verify_cache', action='store_true',
+                        help='Check the files of cached results against their digests before using them, which '
+                             'reads them all. By default, only their sizes are checked.')
+    parser.add_argument('--fingerprint', choices=['stat', 'sample', 'full'], default='stat',
+                        help='How input files contribute to the hashes of jobs, and so to the result cache: '
+                             '"stat" uses their size, modification time and inode, "sample" a digest of parts of '
+                             'their content, and "full" a digest of their whole content. Digests are kept in the '
+                             'result cache, and computed again only for files which changed.')
+    parser.add_argument('--resume', action='store_true',
+                        help='Resume the last run in the working directory, if it was interrupted: the jobs it '
+                             'finished are not computed again.')
     parser.add_argument('--enable_bids_validator',
                         help='skips bids validation',
                         action='store_true')
@@ -176,6 +199,18 @@ def build_context(args) -> context.Context:
         else:
             print('BIDS Validation passed. Continue')
 
+    # Result cache
+    mapping['cache_dir'] = os.path.abspath(args.cache_dir) if args.cache_dir else None
+    mapping['cache_size'] = args.cache_size_gb
+    mapping['cache_verify'] = bool(args.verify_cache)
+    mapping['fingerprint'] = args.fingerprint
+    if mapping['cache_dir']:
+        cache = ResultCache(mapping['cache_dir'], max_size=mapping['cache_size'])
+        if args.clear_cache:
+            cache.clear()
+            print('Result cache cleared.')
+        print(f'Result cache: {mapping["cache_dir"]}, up to {mapping["cache_size"]}GB.')
+
     # flags
     mapping['save_working_dir'] = bool(args.save_working_dir)
     mapping['diagnostics'] = bool(args.diagnostics)
@@ -196,7 +231,7 @@ def main(args=None):
     try:
         print_info()
         ctx = build_context(params)
-        pipeline.build(ctx)
+        pipeline.build(ctx, executor=params.executor, resume=params.resume)
     except Exception as e:
         print(f'{type(e).__name__}:{e}', file=sys.stderr)
         return 1
@@ -1,6 +1,6 @@
 import os
 from dataclasses import dataclass
-from typing import Union, List, Dict
+from typing import Union, List, Dict, Optional
 
 from radiome.core.utils.s3 import S3Resource
 
@@ -16,3 +16,7 @@ class Context:
     save_working_dir: bool
     pipeline_config: Dict
     diagnostics: bool
+    cache_dir: Optional[str] = None
+    cache_size: Optional[float] = None
+    cache_verify: bool = False
+    fingerprint: str = 'stat'
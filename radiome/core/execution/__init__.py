@@ -12,7 +12,10 @@ from radiome.core.resource_pool import InvalidResource, ResourcePool, Resource
 from radiome.core.utils import Hashable, bids
 from radiome.core.utils.path import cwd
 from radiome.core.utils.s3 import S3Resource
+from .cache import ResultCache
 from .executor import Execution
+from .journal import RunJournal
+from .graph import JobGraph
 
 logger = logging.getLogger('radiome.execution.state')
 
@@ -20,25 +23,65 @@ logger = logging.getLogger('radiome.execution.state')
 class State(Hashable):
     _master = True
 
-    def __init__(self, work_dir, resource):
+    def __init__(self, work_dir, resource, cache: ResultCache = None, journal: RunJournal = None):
         self._work_dir = os.path.abspath(work_dir)
         self._resource = resource
+        self._cache = cache
+        self._journal = journal
+        self._restored = None
+
+    def restore(self, outputs):
+        """Use the outputs of a previous run instead of computing the job."""
+        self._restored = (outputs,)
 
     def __call__(self, **dependencies):
         if isinstance(self._resource, Job):
-            resource_hash = hash(self._resource)
-            resource_dir = os.path.join(self._work_dir, str(resource_hash))
+            if self._restored is not None:
+                return self._restored[0]
+
+            # Computed resources only pick a field of their job
+            if isinstance(self._resource, ComputedResource):
+                return self._run(**dependencies)
+
+            key = self.__longhash__()
+            if self._cache is not None:
+                try:
+                    result = self._cache.load(key)
+                except KeyError:
+                    pass
+                else:
+                    if self._journal is not None:
+                        self._journal.record(key, 'done', result)
+                    return result
+
             try:
-                os.makedirs(resource_dir)
-            except:
-                pass
-            logger.info(f'{resource_dir}: {os.path.exists(resource_dir)}')
-            with cwd(resource_dir):
-                result = self._resource(**dependencies)
+                result = self._run(**dependencies)
+            except Exception as e:
+                if self._journal is not None:
+                    self._journal.record(key, 'error', error=e)
+                raise
+
+            if self._cache is not None:
+                result = self._cache.store(key, result, self._resource_dir())
+            if self._journal is not None:
+                self._journal.record(key, 'done', result)
         else:
             result = self._resource(**dependencies)
         return result
 
+    def _resource_dir(self):
+        return os.path.join(self._work_dir, str(hash(self._resource)))
+
+    def _run(self, **dependencies):
+        resource_dir = self._resource_dir()
+        try:
+            os.makedirs(resource_dir)
+        except:
+            pass
+        logger.debug('Working directory %s', resource_dir)
+        with cwd(resource_dir):
+            return self._resource(**dependencies)
+
     def __str__(self):
         return self._resource.__str__()
 
@@ -53,9 +96,11 @@ class State(Hashable):
             return
         if not self._master:
             return
+        # Journaled outputs must outlive the run, to be resumed
+        if self._journal is not None:
+            return
 
-        resource_hash = hash(self._resource)
-        resource_dir = os.path.join(self._work_dir, str(resource_hash))
+        resource_dir = self._resource_dir()
         logger.info(f'Wiping out {self._resource} directory.')
 
         try:
@@ -67,12 +112,18 @@ class State(Hashable):
         return {
             '_resource': self._resource,
             '_work_dir': self._work_dir,
+            '_cache': self._cache,
+            '_journal': self._journal,
+            '_restored': self._restored,
         }
 
     def __setstate__(self, state):
         self._resource = state['_resource']
         self._master = False
         self._work_dir = state['_work_dir']
+        self._cache = state['_cache']
+        self._journal = state['_journal']
+        self._restored = state['_restored']
 
     def resources(self):
         if isinstance(self._resource, Job):
@@ -89,88 +140,118 @@ class State(Hashable):
 
 
 class DependencySolver:
-
-    def __init__(self, resource_pool, ctx: Context = None):
-        self._resource_pool = resource_pool
+    """  Plans the execution of the jobs in a resource pool.
+
+    The solver works on a snapshot of the resource pool, and the plan is
+    built once, on first access, as a JobGraph. `graph` exports it to
+    networkx. `invalidate` drops them, so the next access rebuilds them,
+    e.g. after the pool changed. With a ResultCache, jobs computed by
+    previous runs are loaded instead of computed again. With a RunJournal,
+    finished jobs are recorded, and the jobs recorded by an interrupted
+    run are not computed again, so execution continues from where it
+    stopped.
+
+    """
+
+    def __init__(self, resource_pool, ctx: Context = None, cache: ResultCache = None, journal: RunJournal = None):
+        self._resource_pool = resource_pool.snapshot()
+        self._cache = cache
+        self._journal = journal
+        self._plan = None
+        self._graph = None
         if ctx is None:
             ctx = SimpleNamespace()
             ctx.outputs_dir = os.path.abspath('.')
             ctx.working_dir = os.path.abspath('.')
         self._ctx = ctx
 
-    @property
-    def graph(self):
-        G = nx.DiGraph(resource_pool=self._resource_pool)
-
-        instances = {}
-
-        extra_dependencies = set()
-        for key, resource in self._resource_pool:
-            resource_id = id(resource)
-            references = {key}
-
-            if resource_id not in instances:
-                instances[resource_id] = resource
+    def invalidate(self, resource_pool=None):
+        """Drop the planned graph.
 
-            if resource_id in G:
-                references |= G.nodes[resource_id]['references']
+        Args:
+            resource_pool: Resource pool to plan from now on. If not set, the
+                current snapshot is kept.
+        """
+        if resource_pool is not None:
+            self._resource_pool = resource_pool.snapshot()
+        self._plan = None
+        self._graph = None
 
-            G.add_node(resource_id, job=State(self._ctx.working_dir, resource), references=references)
-
-            for field, dep in resource.dependencies().items():
-                dep_id = id(dep)
-
-                if dep_id not in G:
-                    G.add_node(dep_id, job=State(self._ctx.working_dir, dep))
-                G.add_edge(dep_id, resource_id, field=field)
+    @property
+    def plan(self) -> JobGraph:
+        if self._plan is None:
+            self._plan = self._build_plan()
+        return self._plan
 
-                if dep_id not in instances:
-                    instances[dep_id] = dep
+    @property
+    def graph(self) -> nx.DiGraph:
+        if self._graph is None:
+            self._graph = self.plan.to_networkx(resource_pool=self._resource_pool)
+        return self._graph
+
+    def _build_plan(self) -> JobGraph:
+        nodes = {}
+        jobs = []
+        ids = []
+        references = {}
+        edges = []
+        pending = []
+
+        def node(resource):
+            resource_id = id(resource)
+            if resource_id not in nodes:
+                nodes[resource_id] = len(jobs)
+                job = State(self._ctx.working_dir, resource, cache=self._cache, journal=self._journal)
+                jobs.append(job)
+                ids.append(resource_id)
+                pending.append(resource)
+            return nodes[resource_id]
 
-                if dep_id not in extra_dependencies:
-                    extra_dependencies |= {dep_id}
+        for key, resource in self._resource_pool:
+            references.setdefault(node(resource), set()).add(key)
 
-        while extra_dependencies:
-            resource_id = extra_dependencies.pop()
-            resource = instances[resource_id]
+        while pending:
+            resource = pending.pop()
+            resource_node = nodes[id(resource)]
             for field, dep in resource.dependencies().items():
-                dep_id = id(dep)
-                if dep_id not in G:
-                    G.add_node(dep_id, job=State(self._ctx.working_dir, dep))
-                G.add_edge(dep_id, resource_id, field=field)
-
-                if dep_id not in instances:
-                    instances[dep_id] = dep
-                    extra_dependencies |= {dep_id}
-
-        try:
-            nx.find_cycle(G, orientation='original')
-            raise ValueError('Graph cannot have cycles')
-        except nx.NetworkXNoCycle:
-            pass
-
-        relabeling = {}
-        for resource in nx.topological_sort(G):
-            job = G.nodes[resource]['job']
-            jobid = id(job)
-            job.__update_hash__()
-            G.nodes[resource]['job'] = job
-
-        return G
+                edges.append((node(dep), resource_node, field))
+
+        plan = JobGraph(jobs, edges, ids=ids, references=references)
+
+        # Hashes are kept up to date by the jobs, only the ones cleared by
+        # changes are computed, upstream first to avoid deep recursions
+        for resource in plan.order:
+            jobs[resource].__longhash__()
+
+        if self._journal is not None:
+            completed = self._journal.completed()
+            restored = 0
+            for job in jobs:
+                key = job.__longhash__()
+                if key in completed and not isinstance(job.resource, ComputedResource):
+                    job.restore(completed[key])
+                    # Outputs may point to the cache, which must keep them
+                    if self._cache is not None:
+                        self._cache.touch(key)
+                    restored += 1
+            if restored:
+                logger.info('Resuming %d of %d jobs from the journal', restored, len(jobs))
+
+        return plan
 
     def execute(self, executor=None):
-        G = self.graph
+        plan = self.plan
 
         if not executor:
             executor = Execution()
 
         logger.info(f'Executing with {executor.__class__.__name__}')
-        results = executor.execute(graph=G)
+        results = executor.execute(graph=plan)
         return self._gather(results)
 
     def _gather(self, results):
         logger.info('Gathering resources')
-        resource_pool = ResourcePool()
+        gathered = []
 
         is_s3_outputs = isinstance(self._ctx.outputs_dir, S3Resource)
         if is_s3_outputs:
@@ -179,14 +260,14 @@ class DependencySolver:
             local_output_dir = self._ctx.outputs_dir
         Path(local_output_dir).mkdir(parents=True, exist_ok=True)
 
-        for _, attr in self.graph.nodes.items():
-            job = attr['job']
+        plan = self.plan
+        for node, references in plan.references.items():
+            job = plan.job(node)
             if not isinstance(job.resource, ComputedResource):
                 continue
 
             job_hash = hash(job)
 
-            references = attr.get('references', [])
             if not references:
                 continue
 
@@ -195,7 +276,7 @@ class DependencySolver:
             else:
                 result = InvalidResource(job)
 
-            for key in attr.get('references', []):
+            for key in references:
                 if isinstance(result, Path):
                     logger.info(f'Setting {result} in {key}')
                     ext = os.path.basename(result).split('.', 1)[-1]
@@ -211,7 +292,9 @@ class DependencySolver:
 
                     bids_file = os.path.join(bids_dir, f'{key}.{ext}')
                     result = self._ctx.outputs_dir / bids_file if is_s3_outputs else Resource(output)
-                resource_pool[key] = result
+                gathered.append((key, result))
+
+        resource_pool = ResourcePool.from_items(gathered)
 
         if is_s3_outputs:
             logger.info("Uploading result to the output bucket.....")
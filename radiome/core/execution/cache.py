@@ -0,0 +1,311 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from pathlib import PurePath
+from typing import Any, Dict, Optional
+
+import cloudpickle
+
+logger = logging.getLogger('radiome.execution.cache')
+
+
+def _digest(path: str) -> str:
+    hasher = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _relocate(obj: Any, source: str, destination: str) -> Any:
+    """Replace the `source` directory by `destination` in the paths of a
+    result."""
+    if isinstance(obj, str):
+        if obj == source or obj.startswith(source + os.sep):
+            return destination + obj[len(source):]
+        return obj
+
+    if isinstance(obj, PurePath):
+        return type(obj)(_relocate(str(obj), source, destination))
+
+    if isinstance(obj, dict):
+        return {k: _relocate(v, source, destination) for k, v in obj.items()}
+
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_relocate(v, source, destination) for v in obj)
+
+    return obj
+
+
+class _Usage:
+    """  Sizes and last uses of the entries of a cache directory.
+
+    The directory is listed once per process, and the usage is shared by
+    the caches of the process, including the ones unpickled along with
+    jobs. Stores and loads keep it up to date, so the total size of the
+    cache is known without listing it again.
+
+    """
+
+    def __init__(self, directory: str):
+        self._directory = directory
+        self.entries = {}
+        self.size = 0
+        self.scan()
+
+    def scan(self):
+        """Read the usage from the directory again, as other processes may
+        have stored or evicted entries."""
+        self.entries = {}
+        self.size = 0
+        for key in os.listdir(self._directory):
+            manifest_path = os.path.join(self._directory, key, ResultCache._MANIFEST)
+            try:
+                with open(manifest_path) as f:
+                    size = json.load(f)['size']
+                used = os.path.getmtime(manifest_path)
+            except (OSError, ValueError, KeyError):
+                continue
+            self.add(key, used, size)
+
+    def add(self, key: str, used: float, size: int):
+        self.remove(key)
+        self.entries[key] = (used, size)
+        self.size += size
+
+    def remove(self, key: str):
+        previous = self.entries.pop(key, None)
+        if previous is not None:
+            self.size -= previous[1]
+
+
+_usages: Dict[str, _Usage] = {}
+
+
+class ResultCache:
+    """  Content-addressed store of job results, shared across runs.
+
+    Results are stored by the long hash of their job, which only depends
+    on the job and its inputs, along with a copy of the working directory
+    of the job, since results usually are files in it. Paths in the results
+    are relocated to the copy.
+
+    Each entry records the digests of its result and files. When it is
+    looked up, the result is checked against its digest and the files
+    against their sizes, or also against their digests if requested, and
+    an entry which does not match them anymore is dropped. Beyond the size
+    limit, the least recently used entries are evicted, except the ones
+    used since the cache was created, as the results of the current run
+    may still point to them.
+
+    """
+
+    _RESULT = 'result.pkl'
+    _MANIFEST = 'manifest.json'
+    _FILES = 'files'
+
+    def __init__(self, directory: str, max_size: Optional[float] = None, verify_files: bool = False):
+        """
+        Create a result cache.
+
+        Args:
+            directory: Directory of the cache, created if needed.
+            max_size: Size limit of the cache, in gigabytes. Unbounded if
+                not set.
+            verify_files: Check the files of entries against their digests
+                when they are looked up, which reads them all.
+        """
+        self._directory = os.path.abspath(directory)
+        self._max_size = max_size * 1024 ** 3 if max_size is not None else None
+        self._verify_files = verify_files
+        self._created = time.time()
+        os.makedirs(self._directory, exist_ok=True)
+
+        if self._max_size is not None:
+            _usages[self._directory] = _Usage(self._directory)
+
+    @property
+    def directory(self) -> str:
+        return self._directory
+
+    def _entry(self, key: str) -> str:
+        return os.path.join(self._directory, key)
+
+    def _usage(self) -> _Usage:
+        usage = _usages.get(self._directory)
+        if usage is None:
+            usage = _usages[self._directory] = _Usage(self._directory)
+        return usage
+
+    def __contains__(self, key: str) -> bool:
+        return os.path.exists(os.path.join(self._entry(key), self._MANIFEST))
+
+    def load(self, key: str) -> Any:
+        """Load the result of a job, and mark it as recently used.
+
+        Args:
+            key: Long hash of the job.
+
+        Raises:
+            KeyError: The result is not in the cache, or its entry is
+                corrupted, in which case it is dropped.
+        """
+        entry = self._entry(key)
+        manifest_path = os.path.join(entry, self._MANIFEST)
+        try:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            raise KeyError(key)
+
+        try:
+            self._verify(entry, manifest)
+            with open(os.path.join(entry, self._RESULT), 'rb') as f:
+                result = cloudpickle.load(f)
+        except Exception as e:
+            logger.warning('Dropping corrupted cache entry %s: %s', key, e)
+            self._remove(entry)
+            if self._max_size is not None:
+                self._usage().remove(key)
+            raise KeyError(key)
+
+        used = self._touch(manifest_path)
+        if self._max_size is not None:
+            self._usage().add(key, used, manifest['size'])
+        logger.info('Loaded result of %s from the cache', key)
+        return result
+
+    def touch(self, key: str):
+        """Mark the entry of a job as used, if it is in the cache, so it is
+        not evicted while the results of the current run point to it.
+
+        Args:
+            key: Long hash of the job.
+        """
+        try:
+            used = self._touch(os.path.join(self._entry(key), self._MANIFEST))
+        except OSError:
+            return
+
+        if self._max_size is not None:
+            usage = self._usage()
+            if key in usage.entries:
+                usage.add(key, used, usage.entries[key][1])
+
+    def _verify(self, entry: str, manifest: dict):
+        if _digest(os.path.join(entry, self._RESULT)) != manifest['result']:
+            raise ValueError('result does not match its digest')
+        for name, (size, digest) in manifest['files'].items():
+            path = os.path.join(entry, self._FILES, name)
+            if os.path.getsize(path) != size:
+                raise ValueError(f'file {name} does not match its size')
+            if self._verify_files and _digest(path) != digest:
+                raise ValueError(f'file {name} does not match its digest')
+
+    def store(self, key: str, result: Any, working_dir: Optional[str] = None) -> Any:
+        """Store the result of a job, with a copy of its working directory.
+
+        Args:
+            key: Long hash of the job.
+            result: Result of the job.
+            working_dir: Working directory of the job.
+
+        Returns:
+            The result, with its paths relocated to the copy of the working
+            directory, or the result as is if it could not be stored.
+        """
+        entry = self._entry(key)
+
+        def relocated():
+            if not working_dir:
+                return result
+            return _relocate(result, os.path.abspath(working_dir), os.path.join(entry, self._FILES))
+
+        if key in self:
+            return relocated()
+
+        # Entries are written aside and moved in place, so an interrupted
+        # or concurrent store never leaves a partial entry
+        staging = os.path.join(self._directory, f'.staging-{uuid.uuid4().hex}')
+        try:
+            staging_files = os.path.join(staging, self._FILES)
+            if working_dir and os.path.isdir(working_dir):
+                shutil.copytree(working_dir, staging_files, symlinks=True)
+            else:
+                os.makedirs(staging_files)
+
+            manifest = {'files': {}, 'size': 0}
+            for root, _, filenames in os.walk(staging_files):
+                for filename in filenames:
+                    path = os.path.join(root, filename)
+                    if os.path.islink(path):
+                        continue
+                    size = os.path.getsize(path)
+                    manifest['files'][os.path.relpath(path, staging_files)] = (size, _digest(path))
+                    manifest['size'] += size
+
+            result_path = os.path.join(staging, self._RESULT)
+            with open(result_path, 'wb') as f:
+                cloudpickle.dump(relocated(), f)
+            manifest['result'] = _digest(result_path)
+            manifest['size'] += os.path.getsize(result_path)
+
+            with open(os.path.join(staging, self._MANIFEST), 'w') as f:
+                json.dump(manifest, f)
+            used = self._touch(os.path.join(staging, self._MANIFEST))
+
+            os.rename(staging, entry)
+        except OSError as e:
+            self._remove(staging)
+            # The same job may have been stored meanwhile by another worker
+            if key in self:
+                return relocated()
+            logger.warning('Could not store result of %s in the cache: %s', key, e)
+            return result
+
+        logger.info('Stored result of %s in the cache', key)
+        if self._max_size is not None:
+            usage = self._usage()
+            usage.add(key, used, manifest['size'])
+            if usage.size > self._max_size:
+                self._evict()
+        return relocated()
+
+    def _evict(self):
+        usage = self._usage()
+        usage.scan()
+
+        entries = sorted(
+            (used, size, key)
+            for key, (used, size) in usage.entries.items()
+        )
+        for used, size, key in entries:
+            if usage.size <= self._max_size or used >= self._created:
+                break
+            logger.info('Evicting result of %s from the cache', key)
+            self._remove(self._entry(key))
+            usage.remove(key)
+
+    @staticmethod
+    def _touch(path: str) -> float:
+        # The modification time of the manifest is the last use of the
+        # entry, and it is compared to the creation of caches, so it is
+        # taken from the same clock
+        now = time.time()
+        os.utime(path, (now, now))
+        return now
+
+    @staticmethod
+    def _remove(path: str):
+        shutil.rmtree(path, ignore_errors=True)
+
+    def clear(self):
+        """Remove every entry of the cache."""
+        for name in os.listdir(self._directory):
+            self._remove(os.path.join(self._directory, name))
+        if self._directory in _usages:
+            _usages[self._directory].scan()
@@ -1,78 +1,339 @@
 import logging
+import os
+import pickle
+import shutil
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 
 import cloudpickle
-import networkx as nx
-from distributed import Client, LocalCluster, get_client, get_worker
+import psutil
+from dask.core import quote
+from dask.highlevelgraph import HighLevelGraph, MaterializedLayer
+from dask.utils import apply
+from distributed import Client, LocalCluster
 from distributed.protocol.serialize import register_serialization_family
 
 from radiome.core.execution import Context
-from radiome.core.execution import Job
+from radiome.core.jobs import ComputedResource
+from radiome.core.resource_pool import InvalidResource, Resource
+from radiome.core.utils import Hashable
 
 logger = logging.getLogger('radiome.execution.executor')
 logger_lock = logger.getChild('lock')
 
 
 def cloudpickle_dumps(x):
-    header = {'serializer': 'cloudpickle'}
-    logger.info(f'Dumping {x}')
-    frames = [cloudpickle.dumps(x)]
+    """Pickle an object with protocol 5, keeping buffers such as NumPy
+    arrays out of band, each in its own frame, so they are not copied.
+    Pythons without protocol 5 pickle the object in a single frame."""
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('Dumping %r', x)
+
+    frames = [None]
+    writeable = []
+
+    def buffer_callback(buffer):
+        frame = buffer.raw()
+        frames.append(frame)
+        writeable.append(not frame.readonly)
+
+    if pickle.HIGHEST_PROTOCOL >= 5:
+        frames[0] = cloudpickle.dumps(x, protocol=5, buffer_callback=buffer_callback)
+    else:
+        frames[0] = cloudpickle.dumps(x)
+    header = {
+        'serializer': 'cloudpickle',
+        'writeable': writeable,
+    }
     return header, frames
 
 
 def cloudpickle_loads(header, frames):
-    if len(frames) > 1:
-        frame = ''.join(frames)
+    buffers = []
+    for frame, writeable in zip(frames[1:], header.get('writeable', ())):
+        frame = memoryview(frame)
+        if writeable and frame.readonly:
+            frame = memoryview(bytearray(frame))
+        buffers.append(frame)
+
+    if buffers:
+        x = cloudpickle.loads(frames[0], buffers=buffers)
     else:
-        frame = frames[0]
-    x = cloudpickle.loads(frame)
-    logger.info(f'Loading {x}')
+        x = cloudpickle.loads(frames[0])
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('Loading %r', x)
     return x
 
 
+def radiome_dumps(x):
+    """Serialize radiome objects, such as jobs, states and resources, and
+    leave any other object to the next serialization family."""
+    if not isinstance(x, Hashable):
+        raise NotImplementedError()
+    header, frames = cloudpickle_dumps(x)
+    header['serializer'] = 'radiome'
+    return header, frames
+
+
 register_serialization_family('cloudpickle', cloudpickle_dumps, cloudpickle_loads)
+register_serialization_family('radiome', radiome_dumps, cloudpickle_loads)
 
 
 class MissingDependenciesException(Exception):
     pass
 
 
+def _in_memory(job) -> bool:
+    """Check if a job only returns a value it holds, as plain Resources do,
+    unlike resources which fetch their content, such as S3Resources."""
+    return type(job.resource) in (Resource, InvalidResource)
+
+
 class Execution:
+    """  Serial execution of a job graph.
+
+    Results are reference-counted: the result of a job is released once
+    every job that consumes it has run, unless the job is referenced by a
+    key in the resource pool. Memory use follows the width of the graph
+    instead of its size.
+
+    """
 
     def __init__(self):
         pass
 
+    @staticmethod
+    def _consumers(graph, hashes):
+        """Count the consumers of each result, and find the results which
+        are referenced by the resource pool."""
+
+        # Jobs with the same hash share their result, so consumers are
+        # counted by hash
+        consumers = {}
+        for node, job_hash in enumerate(hashes):
+            consumers[job_hash] = consumers.get(job_hash, 0) + len(graph.successors(node))
+        kept = {hashes[node] for node in graph.references}
+        return consumers, kept
+
     def execute(self, graph):
         results = {}
+        hashes = [hash(graph.job(node)) for node in range(len(graph))]
+        consumers, kept = self._consumers(graph, hashes)
 
-        edge = lambda G, f, t: G.edges[(f, t)]['field']
-        result = lambda G, n: \
-            results[hash(G.nodes[n]['job'])]
+        def release(job_hash):
+            if not consumers[job_hash] and job_hash not in kept:
+                results.pop(job_hash, None)
 
         logger.info(f'Computing jobs')
-        SGs = (graph.subgraph(c) for c in nx.weakly_connected_components(graph))
-        for SG in SGs:
-            for resource in nx.topological_sort(SG):
-                job = SG.nodes[resource]['job']
+        for component in graph.components():
+            for resource in component:
+                job = graph.job(resource)
+                job_hash = hashes[resource]
+                predecessors = list(graph.predecessors(resource))
                 dependencies = {
-                    edge(SG, dependency, resource): result(SG, dependency)
-                    for dependency in SG.predecessors(resource)
+                    field: results[hashes[dependency]]
+                    for dependency, field in predecessors
                 }
 
+                for dependency, _ in predecessors:
+                    consumers[hashes[dependency]] -= 1
+
                 if any(isinstance(d, Exception) for d in dependencies.values()):
-                    results[hash(job)] = MissingDependenciesException()
-                    continue
+                    results[job_hash] = MissingDependenciesException()
+                else:
+                    logger.info('Computing job %s with deps %s', job.resource, dependencies)
+
+                    try:
+                        results[job_hash] = job(**dependencies)
+                    except Exception as e:
+                        results[job_hash] = e
+                        logger.exception(e)
 
-                logger.info(f'Computing job {job.resource} with deps {dependencies}')
+                del dependencies
+                for dependency, _ in predecessors:
+                    release(hashes[dependency])
+                release(job_hash)
 
-                try:
-                    results[hash(job)] = job(**dependencies)
-                except Exception as e:
-                    results[hash(job)] = e
-                    logger.exception(e)
+        return results
+
+
+def _run_job(payload):
+    job, dependencies = cloudpickle.loads(payload)
+    try:
+        result = job(**dependencies)
+    except Exception as e:
+        logger.exception(e)
+        result = e
+    return cloudpickle.dumps(result)
+
+
+class LocalExecution(Execution):
+    """  Parallel execution of a job graph in a local process pool.
+
+    Jobs are started as soon as their dependencies are computed, as long as
+    their cpu and memory estimates fit in what is available, and at least
+    one job runs at a time. Jobs run in processes, since each job works in
+    its own directory, and so do resources which fetch their content, such
+    as S3Resources. In-memory resources and ComputedResources are cheap,
+    and are computed in the main process. Results are released as in
+    `Execution`.
+
+    """
+
+    def __init__(self, ctx: Context = None, n_cpus: int = None, memory: float = None):
+        """
+        Create a local executor.
+
+        Args:
+            ctx: Context, to take the number of cpus and the memory, in
+                megabytes, from.
+            n_cpus: Number of cpus, which takes precedence over the context.
+                Defaults to the cpus of the machine.
+            memory: Memory in gigabytes, which takes precedence over the
+                context. Defaults to the memory of the machine.
+        """
+        super().__init__()
+
+        if n_cpus is None:
+            n_cpus = ctx.n_cpus if ctx else os.cpu_count()
+        if memory is None:
+            memory = ctx.memory / 1024 if ctx else psutil.virtual_memory().total / 1024 ** 3
+
+        self._n_cpus = max(1, n_cpus)
+        self._memory = memory
+
+    def execute(self, graph):
+        results = {}
+        hashes = [hash(graph.job(node)) for node in range(len(graph))]
+        consumers, kept = self._consumers(graph, hashes)
+
+        waiting = [len(list(graph.predecessors(node))) for node in range(len(graph))]
+        ready = deque(node for node in graph.order if not waiting[node])
+        running = {}
+        used = {'cpu': 0, 'memory': 0}
+
+        def release(job_hash):
+            if not consumers[job_hash] and job_hash not in kept:
+                results.pop(job_hash, None)
+
+        def dispatched(node):
+            for dependency, _ in graph.predecessors(node):
+                consumers[hashes[dependency]] -= 1
+                release(hashes[dependency])
+
+        def computed(node):
+            release(hashes[node])
+            for successor in graph.successors(node):
+                waiting[successor] -= 1
+                if not waiting[successor]:
+                    ready.append(successor)
+
+        logger.info(f'Computing jobs with {self._n_cpus} cpus and {self._memory:.2f}GB of memory')
+        with ProcessPoolExecutor(max_workers=self._n_cpus) as pool:
+            while ready or running:
+                deferred = deque()
+
+                while ready:
+                    node = ready.popleft()
+                    job = graph.job(node)
+                    job_hash = hashes[node]
+                    dependencies = {
+                        field: results[hashes[dependency]]
+                        for dependency, field in graph.predecessors(node)
+                    }
+
+                    if any(isinstance(d, Exception) for d in dependencies.values()):
+                        results[job_hash] = MissingDependenciesException()
+                        dispatched(node)
+                        computed(node)
+                        continue
+
+                    if _in_memory(job) or isinstance(job.resource, ComputedResource):
+                        try:
+                            results[job_hash] = job(**dependencies)
+                        except Exception as e:
+                            results[job_hash] = e
+                            logger.exception(e)
+                        dispatched(node)
+                        computed(node)
+                        continue
+
+                    estimates = job.resources()
+                    cpu, memory = estimates.get('cpu', 0), estimates.get('memory', 0)
+                    if running and (used['cpu'] + cpu > self._n_cpus or
+                                    used['memory'] + memory > self._memory):
+                        deferred.append(node)
+                        continue
+
+                    logger.info('Computing job %s with deps %s', job.resource, dependencies)
+                    future = pool.submit(_run_job, cloudpickle.dumps((job, dependencies)))
+                    running[future] = (node, cpu, memory)
+                    used['cpu'] += cpu
+                    used['memory'] += memory
+                    dispatched(node)
+
+                ready = deferred
+
+                if not running:
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    node, cpu, memory = running.pop(future)
+                    used['cpu'] -= cpu
+                    used['memory'] -= memory
+                    try:
+                        results[hashes[node]] = cloudpickle.loads(future.result())
+                    except Exception as e:
+                        results[hashes[node]] = e
+                        logger.exception(e)
+                    computed(node)
 
         return results
 
 
+def cluster_options(ctx: Context = None) -> dict:
+    """Size a LocalCluster from the context.
+
+    The cpus are split into workers with two threads each, or with a single
+    thread for an odd number of cpus, so every cpu is used. Each worker gets
+    an even share of the memory, in gigabytes, and of the free disk of the
+    working directory, as its memory limit and resource pool. Without a
+    context, the resources of the machine are used.
+
+    Args:
+        ctx: Context, with the number of cpus and the memory in megabytes.
+
+    Returns:
+        Keyword arguments for LocalCluster.
+    """
+    if ctx:
+        n_cpus = ctx.n_cpus
+        memory = ctx.memory / 1024
+        working_dir = ctx.working_dir
+    else:
+        n_cpus = os.cpu_count()
+        memory = psutil.virtual_memory().total / 1024 ** 3
+        working_dir = os.getcwd()
+    storage = shutil.disk_usage(working_dir).free / 1024 ** 3
+
+    n_cpus = max(1, n_cpus)
+    threads_per_worker = 2 if n_cpus % 2 == 0 else 1
+    n_workers = n_cpus // threads_per_worker
+
+    return {
+        'n_workers': n_workers,
+        'threads_per_worker': threads_per_worker,
+        'memory_limit': int(memory * 1024 ** 3 / n_workers),
+        'resources': {
+            'cpu': threads_per_worker,
+            'memory': memory / n_workers,
+            'storage': storage / n_workers,
+        },
+    }
+
+
 class DaskExecution(Execution):
     _self_client = False
 
@@ -80,118 +341,109 @@ class DaskExecution(Execution):
         super().__init__()
 
         if not client:
-            cpus = 4
+            options = cluster_options(ctx)
             cluster = LocalCluster(
-                resources={"memory": 30, "cpu": cpus, "storage": 20},
-                n_workers=cpus,
-                threads_per_worker=2,
                 processes=True,
-                dashboard_address=':8787' if ctx and ctx.diagnostics else None
+                dashboard_address=':8787' if ctx and ctx.diagnostics else None,
+                **options
             )
             client = Client(
                 cluster,
-                serializers=['cloudpickle'],
-                deserializers=['cloudpickle']
+                serializers=['radiome', 'cloudpickle'],
+                deserializers=['radiome', 'cloudpickle']
             )
             self._self_client = True
         self._client = client
 
+    def _capacity(self):
+        """Find the largest amount of each resource a worker holds."""
+        capacity = {}
+        for worker in self._client.scheduler_info()['workers'].values():
+            for name, value in worker.get('resources', {}).items():
+                capacity[name] = max(capacity.get(name, 0), value)
+        return capacity
+
+    @staticmethod
+    def _request(resources, capacity):
+        """Clamp resource requests to what a worker of the cluster holds,
+        and drop the resources no worker holds, so no job waits for a worker
+        that cannot exist."""
+        return {
+            name: min(value, capacity[name])
+            for name, value in resources.items()
+            if name in capacity
+        }
+
     def __del__(self):
         if self._self_client:
             self._client.close()
 
-    def __getstate__(self):
-        return {}
-
-    def __setstate__(self, state):
-        self._client = get_client()
+    def execute(self, graph):
+        """Translate the plan into a dask graph, and submit it to the
+        scheduler at once, so placement is left to the scheduler.
+
+        Each job becomes a task keyed by the job, with its resource requests
+        as annotations, and so does each resource which fetches its content,
+        such as S3Resources, to run on a worker. In-memory resources are
+        embedded as literals. Only the results of jobs referenced by the
+        resource pool are gathered, and the other results are released by
+        the scheduler once they are consumed.
+        """
+        capacity = self._capacity()
+        keys = {}
+        values = {}
+        tasks = {}
+        requests = {}
+
+        def dependency(node):
+            job_hash = hash(graph.job(node))
+            if job_hash in keys:
+                return keys[job_hash]
+            return quote(values[job_hash])
+
+        for resource in graph.order:
+            job = graph.job(resource)
+            job_hash = hash(job)
+
+            if _in_memory(job):
+                if job_hash not in values:
+                    values[job_hash] = job()
+                continue
 
-    async def _result(self, futures):
-        for f in futures:
-            await f._state.wait()
+            if job_hash in keys:
+                continue
 
-    def execute(self, graph):
-        SGs = list(graph.subgraph(c) for c in nx.weakly_connected_components(graph))
-        futures = []
-        for SG in SGs:
-            futures += [
-                self._client.submit(
-                    self.execute_subgraph,
-                    SG=SG,
-                    pure=False,
-                    resources={
-                        'storage': sum([
-                            SG.nodes[resource]['job'].resources()['storage']
-                            for resource in nx.topological_sort(SG)
-                        ])
-                    }
-                )
+            key = keys[job_hash] = f'{job}-{job.__longhash__()}'
+            dependencies = [
+                [field, dependency(node)]
+                for node, field in graph.predecessors(resource)
             ]
+            tasks[key] = (apply, job, [], (dict, dependencies))
+            requests[key] = self._request(job.resources(), capacity)
 
-        logger.info(f'Joining execution of {len(futures)} executions:'
-                    f' {list(str(s.key) for s in futures)}')
-
-        results = {
-            k: v
-            for d in self._client.gather(futures, errors='skip')
-            for k, v in d.items()
+        referenced = {
+            hash(graph.job(node)): keys[hash(graph.job(node))]
+            for node in graph.references
+            if hash(graph.job(node)) in keys
         }
 
-        return results
-
-    def execute_subgraph(self, SG):
-        futures = {}
-
-        client = self._client
-        worker = get_worker()
+        logger.info(f'Submitting {len(tasks)} jobs, joining execution of {len(referenced)} jobs')
 
-        logger.info(f'Computing subgraph')
+        layer = MaterializedLayer(tasks, annotations={'resources': requests.__getitem__})
+        dsk = HighLevelGraph({'radiome': layer}, {'radiome': set()})
+        futures = self._client.get(dsk, list(referenced.values()), sync=False)
+        futures = dict(zip(referenced, futures))
 
-        edge = lambda G, f, t: G.edges[(f, t)]['field']
-        result = lambda G, n: \
-            futures[hash(G.nodes[n]['job'])] \
-                if isinstance(G.nodes[n]['job'].resource, Job) else \
-                G.nodes[n]['job']()
-
-        for resource in nx.topological_sort(SG):
-            job = SG.nodes[resource]['job']
-
-            if not isinstance(job.resource, Job):
-                continue
+        results = self._client.gather(futures, errors='skip')
+        for job_hash, future in futures.items():
+            if future.status == 'error':
+                results[job_hash] = future.exception()
 
-            dependencies = {
-                edge(SG, dependency, resource): result(SG, dependency)
-                for dependency in SG.predecessors(resource)
-            }
-
-            logger.info(f'Computing job {job.resource} with deps {dependencies}')
-
-            resources = job.resources()
-            try:
-                del resources['storage']
-            except:
-                pass
-
-            futures[hash(job)] = client.submit(
-                job,
-                **dependencies,
-                resources=resources,
-                workers=[worker.address],
-                key=str(job),
-                pure=False
-            )
-
-        logger.info(f'Gathering subgraph')
-
-        return {
-            k: v if v is not None else futures[k].exception()
-            for k, v in self._client.gather(
-                futures, errors='skip'
-            ).items()
-        }
+        return results
 
 
 executors = [
     Execution,
+    LocalExecution,
     DaskExecution,
 ]
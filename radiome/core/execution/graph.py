@@ -0,0 +1,179 @@
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import networkx as nx
+
+
+class JobGraph:
+    """  Compact directed acyclic graph of jobs.
+
+    Nodes are numbered from 0 to n - 1 and their jobs are stored in a list.
+    Edges are stored as compressed sparse rows, one for the predecessors of
+    each node, with the input field of each edge, and one for the successors.
+
+    The plan is computed on creation: edges are merged into weakly connected
+    components while they are stored, and a single pass over the topological
+    order, which also detects cycles, assigns each node to its component.
+
+    """
+
+    def __init__(self,
+                 jobs: List[Any],
+                 edges: Iterable[Tuple[int, int, str]],
+                 ids: Optional[Iterable[int]] = None,
+                 references: Optional[Dict[int, Set]] = None):
+        """
+        Create a graph.
+
+        Args:
+            jobs: Job of each node.
+            edges: Triples of source node, destination node and input field
+                of the destination job.
+            ids: External identifier of each node, used as node label when
+                exporting to networkx. Defaults to the node numbers.
+            references: Resource keys of the nodes which are in a resource pool.
+
+        Raises:
+            ValueError: The graph has cycles.
+        """
+        n = len(jobs)
+        edges = list(edges)
+
+        self._jobs = jobs
+        self._ids = array('Q', ids if ids is not None else range(n))
+        self._references = references or {}
+
+        self._pred_offsets, pred_slots = self._offsets(n, (dst for _, dst, _ in edges))
+        self._succ_offsets, succ_slots = self._offsets(n, (src for src, _, _ in edges))
+
+        self._pred_nodes = array('q', bytes(8 * len(edges)))
+        self._pred_fields = [None] * len(edges)
+        self._succ_nodes = array('q', bytes(8 * len(edges)))
+
+        parent = array('q', range(n))
+
+        def find(node):
+            root = node
+            while parent[root] != root:
+                root = parent[root]
+            while parent[node] != root:
+                parent[node], node = root, parent[node]
+            return root
+
+        for src, dst, field in edges:
+            root, other = find(src), find(dst)
+            if root != other:
+                parent[other] = root
+
+            slot = pred_slots[dst]
+            self._pred_nodes[slot] = src
+            self._pred_fields[slot] = field
+            pred_slots[dst] = slot + 1
+
+            slot = succ_slots[src]
+            self._succ_nodes[slot] = dst
+            succ_slots[src] = slot + 1
+
+        self._order = self._topological_order()
+
+        self._component = array('q', bytes(8 * n))
+        self._components = []
+        indexes = {}
+        for node in self._order:
+            root = find(node)
+            index = indexes.get(root)
+            if index is None:
+                index = indexes[root] = len(self._components)
+                self._components.append([])
+            self._components[index].append(node)
+            self._component[node] = index
+
+    @staticmethod
+    def _offsets(n: int, nodes: Iterable[int]) -> Tuple[array, array]:
+        """Compute the row offsets for edges grouped by `nodes`, and a copy
+        of them to be used as insertion cursors."""
+        offsets = array('q', bytes(8 * (n + 1)))
+        for node in nodes:
+            offsets[node + 1] += 1
+        for node in range(n):
+            offsets[node + 1] += offsets[node]
+        return offsets, array('q', offsets[:-1])
+
+    def _topological_order(self) -> array:
+        pred_offsets = self._pred_offsets
+        succ_offsets = self._succ_offsets
+        succ_nodes = self._succ_nodes
+
+        n = len(self._jobs)
+        in_degree = array('q', [pred_offsets[i + 1] - pred_offsets[i] for i in range(n)])
+        order = array('q', [i for i in range(n) if not in_degree[i]])
+
+        position = 0
+        while position < len(order):
+            node = order[position]
+            position += 1
+            for successor in succ_nodes[succ_offsets[node]:succ_offsets[node + 1]]:
+                in_degree[successor] -= 1
+                if not in_degree[successor]:
+                    order.append(successor)
+
+        if len(order) != n:
+            raise ValueError('Graph cannot have cycles')
+
+        return order
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    @property
+    def order(self) -> array:
+        """Nodes in topological order."""
+        return self._order
+
+    @property
+    def references(self) -> Dict[int, Set]:
+        """Resource keys of the nodes which are in the resource pool."""
+        return self._references
+
+    def job(self, node: int) -> Any:
+        return self._jobs[node]
+
+    def predecessors(self, node: int) -> Iterator[Tuple[int, str]]:
+        """Iterate over the predecessors of a node, with the input field
+        each one is connected to."""
+        start, end = self._pred_offsets[node], self._pred_offsets[node + 1]
+        return zip(self._pred_nodes[start:end], self._pred_fields[start:end])
+
+    def successors(self, node: int) -> array:
+        return self._succ_nodes[self._succ_offsets[node]:self._succ_offsets[node + 1]]
+
+    def components(self) -> List[List[int]]:
+        """Retrieve the nodes of each weakly connected component, in
+        topological order."""
+        return self._components
+
+    def component(self, node: int) -> int:
+        """Retrieve the index of the component of a node."""
+        return self._component[node]
+
+    def to_networkx(self, **attrs) -> nx.DiGraph:
+        """Export the graph to networkx, for debugging and graph matching.
+
+        Nodes are labelled by their ids, and hold the `job` and, if in the
+        resource pool, the `references` attributes. Edges hold the `field`
+        attribute.
+
+        Args:
+            attrs: Graph attributes.
+        """
+        G = nx.DiGraph(**attrs)
+        ids = self._ids
+        for node, job in enumerate(self._jobs):
+            if node in self._references:
+                G.add_node(ids[node], job=job, references=self._references[node])
+            else:
+                G.add_node(ids[node], job=job)
+        for node in range(len(self._jobs)):
+            for src, field in self.predecessors(node):
+                G.add_edge(ids[src], ids[node], field=field)
+        return G
@@ -0,0 +1,119 @@
+import base64
+import json
+import logging
+import os
+from pathlib import PurePath
+from typing import Any, Dict, Iterator
+
+import cloudpickle
+
+logger = logging.getLogger('radiome.execution.journal')
+
+
+def _paths(obj: Any) -> Iterator[str]:
+    """Find the absolute paths among the outputs of a job."""
+    if isinstance(obj, str):
+        if os.path.isabs(obj):
+            yield obj
+
+    elif isinstance(obj, PurePath):
+        yield from _paths(str(obj))
+
+    elif isinstance(obj, dict):
+        for v in obj.values():
+            yield from _paths(v)
+
+    elif isinstance(obj, (list, tuple)):
+        for v in obj:
+            yield from _paths(v)
+
+
+class RunJournal:
+    """  Append-only journal of the jobs finished by a run.
+
+    Each record is a line with the long hash of a job, its status and, for
+    jobs which succeeded, its pickled outputs. Records are appended with a
+    single write and synced to disk, so a run which dies keeps every record
+    written so far, and at worst a truncated last line, which is ignored.
+
+    A resumed run reads the journal once, and does not compute again the
+    jobs which succeeded, as long as the files of their outputs are still
+    there.
+
+    """
+
+    def __init__(self, path: str):
+        """
+        Create a run journal.
+
+        Args:
+            path: Path of the journal file.
+        """
+        self._path = os.path.abspath(path)
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def record(self, key: str, status: str, outputs: Any = None, error: Exception = None):
+        """Append the record of a finished job.
+
+        Args:
+            key: Long hash of the job.
+            status: `done` or `error`.
+            outputs: Outputs of the job.
+            error: Exception raised by the job.
+        """
+        entry = {'job': key, 'status': status}
+        if status == 'done':
+            entry['outputs'] = base64.b64encode(cloudpickle.dumps(outputs)).decode('ascii')
+        elif error is not None:
+            entry['error'] = repr(error)
+        line = (json.dumps(entry) + '\n').encode('utf-8')
+
+        fd = os.open(self._path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def completed(self) -> Dict[str, Any]:
+        """Read the outputs of the jobs which succeeded, by long hash.
+
+        Jobs with output files missing are left out, so they are computed
+        again, whether the files were in the working directory or, for
+        instance, in an entry of a result cache.
+        """
+        completed = {}
+        try:
+            with open(self._path, 'rb') as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return completed
+
+        for line in lines:
+            try:
+                entry = json.loads(line)
+                key, status = entry['job'], entry['status']
+                if status == 'done':
+                    completed[key] = cloudpickle.loads(base64.b64decode(entry['outputs']))
+                else:
+                    completed.pop(key, None)
+            except Exception:
+                logger.warning('Ignoring malformed journal record: %r', line[:100])
+
+        for key, outputs in list(completed.items()):
+            missing = [path for path in _paths(outputs) if not os.path.exists(path)]
+            if missing:
+                logger.info('Computing %s again, its outputs are missing: %s', key, missing)
+                del completed[key]
+
+        return completed
+
+    def clear(self):
+        """Start a new journal."""
+        try:
+            os.remove(self._path)
+        except FileNotFoundError:
+            pass
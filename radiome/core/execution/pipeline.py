@@ -5,8 +5,11 @@ import shutil
 
 from radiome.core import schema
 from radiome.core.execution import DependencySolver, loader, Context
-from radiome.core.execution.executor import DaskExecution, Execution
-from radiome.core.resource_pool import ResourcePool, Resource
+from radiome.core.execution.cache import ResultCache
+from radiome.core.execution.executor import DaskExecution, Execution, LocalExecution
+from radiome.core.execution.journal import RunJournal
+from radiome.core.resource_pool import ResourcePool
+from radiome.core.utils import fingerprint
 from radiome.core.utils.s3 import S3Resource
 
 logger = logging.getLogger(__name__)
@@ -17,29 +20,59 @@ def load_resource(resource_pool: ResourcePool, ctx: Context):
     participant_label = ctx.participant_label
     is_s3 = isinstance(inputs_dir, S3Resource)
     walk = inputs_dir.walk if is_s3 else functools.partial(os.walk, inputs_dir, topdown=False)
-    for root, dirs, files in walk():
-        for f in files:
+    files = []
+    for root, dirs, filenames in walk():
+        for f in filenames:
             logger.debug(f'Processing file {root}/{f}.')
             if 'nii' in f:
                 filename: str = f.split('.')[0]
                 if participant_label is None or any([label in filename for label in participant_label]):
-                    resource_pool[filename] = inputs_dir % os.path.join(root, f) \
-                        if is_s3 \
-                        else Resource(os.path.join(root, f))
-                    logger.info(f'Added {filename} to the resource pool.')
+                    files.append(inputs_dir % os.path.join(root, f)
+                                 if is_s3
+                                 else os.path.join(root, f))
+    resource_pool.update(files)
+    logger.info(f'Added {len(files)} files to the resource pool.')
 
 
-def build(context: Context, disable_concurrency=False, **kwargs) -> ResourcePool:
+executors = {
+    'serial': lambda ctx: Execution(),
+    'local': lambda ctx: LocalExecution(ctx=ctx),
+    'dask': lambda ctx: DaskExecution(ctx=ctx),
+}
+
+
+def build(context: Context, disable_concurrency=False, executor='dask', resume=False, **kwargs) -> ResourcePool:
+    if executor not in executors:
+        raise ValueError(f'Invalid executor "{executor}", options are: {", ".join(executors)}')
+
+    cache = ResultCache(
+        context.cache_dir,
+        max_size=context.cache_size,
+        verify_files=context.cache_verify,
+    ) if context.cache_dir else None
+
+    # Digests of the input files are kept along with the cached results
+    index = fingerprint.configure(
+        os.path.join(cache.directory, 'fingerprints.json') if cache else None,
+        mode=context.fingerprint,
+    )
+
     rp = ResourcePool()
     load_resource(rp, context)
     for entry, params in schema.steps(context.pipeline_config):
         loader.load(entry)(params, rp, context)
 
+    # The working directory is only removed once the run completed, so the
+    # journal of an interrupted run is there to be resumed
+    journal = RunJournal(os.path.join(context.working_dir, 'journal.jsonl'))
+    if not resume:
+        journal.clear()
+
     logger.info('Executing pipeline...')
     if disable_concurrency:
-        res_rp = DependencySolver(rp, context).execute(executor=Execution())
-    else:
-        res_rp = DependencySolver(rp, context).execute(executor=DaskExecution(ctx=context))
+        executor = 'serial'
+    res_rp = DependencySolver(rp, context, cache=cache, journal=journal).execute(executor=executors[executor](context))
+    index.save()
     logger.info('Execution Completed.')
 
     if not context.save_working_dir:
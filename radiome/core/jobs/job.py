@@ -1,6 +1,10 @@
 import copy
+import functools
+import hashlib
 import logging
+import types
 from pathlib import Path
+from weakref import WeakValueDictionary
 
 import cloudpickle
 from nipype.interfaces.base import File, BaseInterface, Undefined
@@ -11,10 +15,70 @@ from radiome.core.utils.s3 import S3Resource
 
 logger = logging.getLogger('radiome.execution.jobs')
 
+_FINGERPRINTS_SIZE = 4096
+_fingerprints = {}
+
+
+@functools.lru_cache(maxsize=None)
+def _referenced_names(code):
+    """Retrieve the global names referenced by a code object and the code
+    objects nested in it."""
+    names = set()
+    codes = [code]
+    while codes:
+        code = codes.pop()
+        names.update(code.co_names)
+        codes.extend(c for c in code.co_consts if isinstance(c, types.CodeType))
+    return tuple(sorted(names))
+
+
+def _function_fingerprint(function):
+    """Digest the pickle of a callable.
+
+    Python functions are pickled once per combination of code object,
+    closure cells, defaults and referenced globals, which is kept in a
+    process-wide cache. The objects involved are held by the cache, so
+    their identities are not reused while it is in place.
+    """
+    code = getattr(function, '__code__', None)
+    if not isinstance(code, types.CodeType):
+        return hashlib.blake2s(cloudpickle.dumps(function)).hexdigest()
+
+    function_globals = function.__globals__
+    pinned = [function.__defaults__, function.__kwdefaults__]
+    for cell in function.__closure__ or ():
+        pinned.append(cell)
+        try:
+            pinned.append(cell.cell_contents)
+        except ValueError:
+            pinned.append(None)
+    for name in _referenced_names(code):
+        pinned.append(function_globals.get(name))
+
+    key = (code, id(function_globals), tuple(id(obj) for obj in pinned))
+
+    entry = _fingerprints.get(key)
+    if entry is None:
+        if len(_fingerprints) >= _FINGERPRINTS_SIZE:
+            _fingerprints.clear()
+        entry = (pinned, function_globals, hashlib.blake2s(cloudpickle.dumps(function)).hexdigest())
+        _fingerprints[key] = entry
+
+    return entry[2]
+
 
 class Job(Hashable):
+    """  Base class of jobs.
+
+    Job hashes form a Merkle DAG: the hash of a job combines its own
+    parameters with the cached hashes of its inputs. Jobs keep track of the
+    jobs that use them as inputs, so setting an input only clears the hashes
+    downstream of the modified job.
+
+    """
     _reference = None
     _inputs = None
+    _dependents = None
 
     _estimates = None
 
@@ -41,13 +105,10 @@ class Job(Hashable):
         return str(self)
 
     def __hashcontent__(self):
-        inputs = {
-            k: FakeJob(v) if isinstance(v, Job) else v
-            for k, v in self._inputs.items()
-        }
+        # Jobs in the inputs contribute their cached hashes
         return (
             self._reference,
-            tuple(list(sorted(inputs.items(), key=lambda i: i[0])))
+            tuple(sorted(self._inputs.items(), key=lambda i: i[0]))
         )
 
     def __call__(self, **kwargs):
@@ -82,7 +143,7 @@ class Job(Hashable):
 
     def __setattr__(self, attr, value):
         if attr.startswith('_'):
-            self.__dict__[attr] = value
+            object.__setattr__(self, attr, value)
             return
 
         if not isinstance(value, Resource):
@@ -90,8 +151,40 @@ class Job(Hashable):
         elif type(value) == Resource or type(value) == S3Resource:
             value = copy.copy(value)
 
+        previous = self._inputs.get(attr)
+        if isinstance(value, Job):
+            value._add_dependent(self)
+
         self._inputs[attr] = value
+
+        # The previous input may still be used by another input of the job
+        if isinstance(previous, Job) and previous._dependents is not None and \
+                not any(v is previous for v in self._inputs.values()):
+            previous._dependents.pop(id(self), None)
+
+        self._invalidate()
+
+    def _add_dependent(self, job):
+        # Jobs are tracked by identity, their hashes depend on this job
+        if self._dependents is None:
+            self._dependents = WeakValueDictionary()
+        self._dependents[id(job)] = job
+
+    def _invalidate(self):
+        """Clear the hash of the job and of the jobs downstream of it.
+
+        A job only holds a hash while its inputs hold theirs, so the
+        traversal stops at jobs whose hash is already cleared.
+        """
         self._hash = None
+        stack = list(self._dependents.values()) if self._dependents else []
+        while stack:
+            job = stack.pop()
+            if job._hash is None:
+                continue
+            job._hash = None
+            if job._dependents:
+                stack.extend(job._dependents.values())
 
     def dependencies(self):
         return self._inputs.copy()
@@ -154,7 +247,7 @@ class PythonJob(Job):
     def __hashcontent__(self):
         return (
             super().__hashcontent__(),
-            cloudpickle.dumps(self._function)
+            _function_fingerprint(self._function)
         )
 
     def __call__(self, **kwargs):
@@ -184,8 +277,10 @@ class ComputedResource(Job, Resource):
         self._job = job
         self._field = field
         self._content = (job, field)
+        self._hash = None
         self._inputs = {'state': job}
         self._bids_name = self._bids_name or 'unnamed'
+        job._add_dependent(self)
 
         self._estimates = {
             'cpu': 1,
@@ -224,6 +319,7 @@ class ComputedResource(Job, Resource):
         self._field = state['_field']
         self._job = state['_job']
         self._content = (self._job, self._field)
+        self._hash = None
         self._inputs = {'state': self._job}
 
     @property
@@ -257,7 +353,7 @@ class NipypeJob(Job):
 
     def __setattr__(self, attr, value):
         if attr.startswith('_'):
-            self.__dict__[attr] = value
+            object.__setattr__(self, attr, value)
             return
         if attr not in self._interface.inputs.visible_traits():
             raise AttributeError(f'Invalid input name: {attr}')
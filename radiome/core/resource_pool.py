@@ -1,9 +1,17 @@
+import copy
+import functools
 import itertools
+import operator
+import os
 import re
-from collections import OrderedDict
-from typing import Any, Union, List, Tuple, Set, Dict, Iterator
+import sys
+from pathlib import PurePath
+from types import MappingProxyType
+from typing import Any, Union, List, Tuple, Set, FrozenSet, Dict, Iterable, Iterator, Mapping, Optional
+from weakref import WeakValueDictionary
 
 from radiome.core.utils import Hashable
+from radiome.core.utils.fingerprint import fingerprint
 
 
 class Strategy(Hashable):
@@ -15,86 +23,143 @@ class Strategy(Hashable):
     FORMAT = rf'[^{_KVS}{_FS}]+{_KVS}[^{_FS}]+({_FS}[^{_KVS}{_FS}]+{_KVS}[^{_FS}]+)*'
     del _KVS, _FS
 
-    _forks: Dict[str, str]
+    __slots__ = ('_forks', '_mapping', '_str', '_hash', '_int_hash', '__weakref__')
 
-    def __init__(self,
-                 forks=None,
-                 **kwargs):
+    _forks: Tuple[Tuple[str, str], ...]
+    _mapping: Mapping[str, str]
+    _str: str
+
+    _interned: 'WeakValueDictionary[Tuple[Tuple[str, str], ...], Strategy]' = WeakValueDictionary()
+    _interned_strings: 'WeakValueDictionary[str, Strategy]' = WeakValueDictionary()
+
+    def __new__(cls,
+                forks=None,
+                **kwargs):
+
+        if not kwargs:
+            if isinstance(forks, Strategy):
+                return forks
+            if not forks:
+                return cls._empty
 
         if isinstance(forks, str):
+            if not kwargs:
+                interned = cls._interned_strings.get(forks)
+                if interned is not None:
+                    return interned
+
             if not re.match(Strategy.FORMAT, forks):
                 raise ValueError(f'Forks should be in the format '
                                  f'"strat{Strategy.KEYVAL_SEP}value" '
                                  f'separated by {Strategy.FORK_SEP}, '
                                  f'provided: "{forks}"')
-            forks = [
+            parsed = [
                 tuple(strat.split(Strategy.KEYVAL_SEP, 1))
                 for strat in forks.split(Strategy.FORK_SEP)
             ]
         else:
-            forks = forks or {}
-            items = forks.items() if isinstance(forks, dict) else forks
-            forks = [
+            parsed = forks or {}
+            items = parsed.items() if isinstance(parsed, dict) else parsed
+            parsed = [
                 (str(k), str(v))
                 for k, v in items
             ]
 
-        forks += [
+        parsed += [
             (str(k), str(v))
             for k, v in kwargs.items()
         ]
 
-        self._forks = OrderedDict([
-            (str(k), str(v))
-            for k, v in forks
-        ])
+        strategy = cls._intern({
+            str(k): str(v)
+            for k, v in parsed
+        })
+
+        if isinstance(forks, str) and not kwargs:
+            cls._interned_strings[forks] = strategy
+
+        return strategy
+
+    @classmethod
+    def _intern(cls, forks: Dict[str, str]) -> 'Strategy':
+        """Retrieve the shared instance for a set of forks,
+        creating it if it was not seen before."""
+        identity = tuple(
+            (sys.intern(k), v)
+            for k, v in forks.items()
+        )
+
+        strategy = cls._interned.get(identity)
+        if strategy is None:
+            strategy = super().__new__(cls)
+            strategy._forks = identity
+            strategy._mapping = MappingProxyType(dict(identity))
+            strategy._str = Strategy.FORK_SEP.join([
+                f'{k}{Strategy.KEYVAL_SEP}{v}'
+                for k, v in identity
+            ])
+            strategy._hash = None
+            strategy._int_hash = None
+            cls._interned[identity] = strategy
+
+        return strategy
+
+    def __reduce__(self):
+        return Strategy, (self._forks,)
 
     @property
-    def forks(self) -> Dict[str, str]:
-        return OrderedDict(self._forks.items())
+    def forks(self) -> Mapping[str, str]:
+        """Retrieve a read-only mapping of the forks."""
+        return self._mapping
 
     def __hashcontent__(self) -> Any:
-        return tuple(
-            (k, v)
-            for k, v in self._forks.items()
-        )
+        return self._forks
+
+    def __hash__(self) -> int:
+        """Hash the forks for in-process mappings, while __longhash__
+        remains the deterministic hash."""
+        if self._int_hash is None:
+            self._int_hash = hash(self._forks)
+        return self._int_hash
+
+    def __eq__(self, other: Any) -> bool:
+        if self is other:
+            return True
+        if isinstance(other, Strategy):
+            return self._forks == other._forks
+        return super().__eq__(other)
 
     def __repr__(self) -> str:
-        return str(self)
+        return self._str
 
     def __str__(self) -> str:
-        return Strategy.FORK_SEP.join([
-            f'{k}{Strategy.KEYVAL_SEP}{v}'
-            for k, v in self._forks.items()
-        ])
+        return self._str
 
     def __len__(self) -> int:
         return len(self._forks)
 
     def __bool__(self) -> bool:
-        return len(self) > 0
+        return len(self._forks) > 0
 
     __nonzero__ = __bool__
 
     def __iter__(self) -> Iterator[Tuple[str, str]]:
-        return iter(self._forks.items())
+        return iter(self._forks)
 
     def __getitem__(self, key: str) -> str:
-        return self._forks[key]
+        return self._mapping[key]
 
     def __add__(self, other: 'Strategy') -> 'Strategy':
-        s = Strategy({})
-        for k, v in self._forks.items():
-            s._forks[k] = v
-        for k, v in other._forks.items():
-            s._forks[k] = v
-        return s
+        if not other._forks:
+            return self
+        forks = dict(self._forks)
+        forks.update(other._forks)
+        return Strategy._intern(forks)
 
     def __contains__(self, other: 'Strategy') -> bool:
-        my_strat = self.forks
-        other_strat = other.forks
+        my_strat = self._mapping
 
-        for k, v in other_strat.items():
+        for k, v in other._forks:
             if k not in my_strat:
                 continue
             if v != my_strat[k]:
@@ -103,6 +168,9 @@ class Strategy(Hashable):
         return True
 
 
+Strategy._empty = Strategy._intern({})
+
+
 class ResourceKey(Hashable):
     """Representation of a resource, matching BIDS specification.
 
@@ -141,19 +209,38 @@ class ResourceKey(Hashable):
 
     branching_entities: List[str] = ['sub', 'ses', 'run', 'task']
 
+    _positions: Dict[str, int] = {
+        entity: position
+        for position, entity in enumerate(supported_entities)
+    }
+
+    __slots__ = ('_suffix', '_strategy', '_values', '_tags', '_str',
+                 '_entities', '_matcher', '_sort_key', '_hash', '_int_hash', '__weakref__')
+
     _suffix: str
     _strategy: Strategy
-    _entities: Dict[str, str]
-    _tags: Set[str]
+    _values: Tuple[Optional[str], ...]
+    _tags: FrozenSet[str]
+    _str: str
+    _entities: Optional[Mapping[str, str]]
+    _matcher: Optional['ResourceKeyMatcher']
+    _sort_key: Optional[Tuple]
 
-    def __init__(self,
-                 key: Union[str, Dict[str, str], 'ResourceKey', None] = None,
-                 tags: Union[Set[str], None] = None,
-                 **kwargs) -> None:
+    _interned: 'WeakValueDictionary[Tuple, ResourceKey]' = WeakValueDictionary()
+    _interned_strings: 'WeakValueDictionary[Tuple[str, FrozenSet[str]], ResourceKey]' = WeakValueDictionary()
+
+    def __new__(cls,
+                key: Union[str, Dict[str, str], 'ResourceKey', None] = None,
+                tags: Union[Set[str], None] = None,
+                **kwargs) -> 'ResourceKey':
 
         """Initialize a ResourceKey instance, based on a previous key, a mapping
         of entities or a BIDS-valid string.
 
+        Keys are immutable and interned: building a key from an existing key
+        or from a string that was already parsed returns the shared instance
+        without parsing it again.
+
         Args:
             key: The content of the key. A ResourceKey might be provided and
                 specific entities can be overwritten with kwargs.
@@ -175,9 +262,19 @@ class ResourceKey(Hashable):
             False
         """
 
+        tags = frozenset(str(t) for t in tags) if tags else frozenset()
+
+        if not kwargs:
+            if isinstance(key, ResourceKey):
+                if tags <= key._tags:
+                    return key
+            elif isinstance(key, str):
+                interned = cls._interned_strings.get((key, tags))
+                if interned is not None:
+                    return interned
+
         entities = {}
         suffix = '*'
-        tags = tags or set()
         strategy = Strategy()
 
         # initialize dictionary from a key
@@ -192,16 +289,20 @@ class ResourceKey(Hashable):
                 parsed_entities, suffix = parsed_entities[:-1], parsed_entities[-1]
 
             for entity_pair in parsed_entities:
-                key, value = entity_pair.split(ResourceKey.KEYVAL_SEP, 1)
-                entities[key] = value
+                entity, value = entity_pair.split(ResourceKey.KEYVAL_SEP, 1)
+                entities[entity] = value
 
         # initialize from a dictionary or custom parameters
         elif isinstance(key, (dict, ResourceKey)):
 
             if isinstance(key, ResourceKey):
-                suffix = key.suffix
-                tags |= key.tags
-                entities = key._entities.copy()
+                suffix = key._suffix
+                tags |= key._tags
+                entities = {
+                    entity: value
+                    for entity, value in zip(cls.supported_entities, key._values)
+                    if value is not None
+                }
                 strategy = key._strategy
 
             else:
@@ -227,32 +328,22 @@ class ResourceKey(Hashable):
                 else:
                     entities[kwargs_key] = value
 
-        if suffix not in self.valid_suffixes:
+        if suffix not in cls.valid_suffixes:
             raise ValueError(f'Invalid suffix "{suffix}"')
 
-        self._suffix = suffix
-        self._entities = {}
-
         if 'desc' in entities:
-            entities['desc'] = str(entities['desc'])
-            if ResourceKey.STRAT_SEP in entities['desc']:
-                entities['desc'], strategy = entities['desc'].split(ResourceKey.STRAT_SEP)
-                strategy = Strategy(strategy)
+            desc, strategy = cls._split_desc(str(entities['desc']), strategy)
+            if desc is None:
+                del entities['desc']
             else:
-                try:
-                    strategy = Strategy(entities['desc'])
-                    del entities['desc']
-                except ValueError:
-                    pass
+                entities['desc'] = desc
 
         if 'strategy' in entities:
             strategy = Strategy(entities['strategy'])
             del entities['strategy']
 
-        self._strategy = strategy
-
         for entity_key, value in entities.items():
-            if entity_key not in self.supported_entities:
+            if entity_key not in cls.supported_entities:
                 raise KeyError(f'Entity "{entity_key}" is not supported '
                                f'by the resource pool')
 
@@ -260,55 +351,197 @@ class ResourceKey(Hashable):
                 raise ValueError(f'Entity "{entity_key}" value '
                                  f'cannot be empty')
 
-            self._entities[entity_key] = str(value)
+        resource_key = cls._intern(
+            suffix,
+            strategy,
+            tuple(
+                sys.intern(str(entities[entity])) if entity in entities else None
+                for entity in cls.supported_entities
+            ),
+            tags
+        )
 
-        self._tags = {str(t) for t in tags}
+        if isinstance(key, str) and not kwargs:
+            cls._interned_strings[(key, tags)] = resource_key
+
+        return resource_key
+
+    @classmethod
+    def _split_desc(cls, desc: str, strategy: Strategy) -> Tuple[Optional[str], Strategy]:
+        """Separate the strategy from a `desc` value.
+
+        Returns the description, None if the whole value is a strategy, and
+        the strategy, `strategy` if the value has none."""
+        if ResourceKey.STRAT_SEP in desc:
+            desc, forks = desc.split(ResourceKey.STRAT_SEP)
+            return desc, Strategy(forks)
+        try:
+            return None, Strategy(desc)
+        except ValueError:
+            return desc, strategy
+
+    @classmethod
+    def _parse(cls, keys: Iterable[str]) -> List['ResourceKey']:
+        """Parse many BIDS-valid strings at once.
+
+        The result is the same as building each key from its string, but the
+        keys are built straight from their components: strings are split
+        once, positions and strategies are looked up once per distinct
+        entity and description, and no intermediate mapping is built. Keys
+        with entities beyond the supported ones are left to the constructor.
+
+        Raises:
+            ValueError: A key has an invalid suffix or an empty value.
+            KeyError: A key has an unsupported entity.
+        """
+        positions = cls._positions
+        desc_position = positions['desc']
+        size = len(cls.supported_entities)
+        valid_suffixes = frozenset(cls.valid_suffixes)
+        interned_strings = cls._interned_strings
+        tags = frozenset()
+        empty = Strategy()
+        descs = {}
+
+        parsed = []
+        for key in keys:
+            resource_key = interned_strings.get((key, tags))
+            if resource_key is not None:
+                parsed.append(resource_key)
+                continue
 
-    def __lt__(self, other: 'ResourceKey') -> bool:
-        """Compare ResourceKeys based on quantity of entities and strategy.
-        Earlier strategies (with less forks) are considered lesser than new
-        strategies.
+            parts = key.split(ResourceKey.ENTITY_SEP)
+            suffix = '*'
+            if ResourceKey.KEYVAL_SEP not in parts[-1]:
+                suffix = parts.pop()
 
-        Args:
-            other: ResourceKey to be compared to.
+            values = [None] * size
+            for part in parts:
+                entity, value = part.split(ResourceKey.KEYVAL_SEP, 1)
+                position = positions.get(entity)
+                if position is None:
+                    break
+                values[position] = sys.intern(value)
+            else:
+                if suffix not in valid_suffixes:
+                    raise ValueError(f'Invalid suffix "{suffix}"')
+
+                strategy = empty
+                desc = values[desc_position]
+                if desc is not None:
+                    if desc not in descs:
+                        desc, strategy = cls._split_desc(desc, empty)
+                        descs[values[desc_position]] = (desc and sys.intern(desc), strategy)
+                    values[desc_position], strategy = descs[values[desc_position]]
+
+                if '' in values:
+                    entity = cls.supported_entities[values.index('')]
+                    raise ValueError(f'Entity "{entity}" value '
+                                     f'cannot be empty')
+
+                resource_key = cls._intern(suffix, strategy, tuple(values), tags)
+                interned_strings[(key, tags)] = resource_key
+                parsed.append(resource_key)
+                continue
 
-        Returns:
-            True if object is considered lesser than other.
-            False otherwise.
-        """
-        if self.suffix != other.suffix:
-            return self.suffix < other.suffix
+            parsed.append(cls(key))
+
+        return parsed
+
+    @classmethod
+    def _intern(cls,
+                suffix: str,
+                strategy: Strategy,
+                values: Tuple[Optional[str], ...],
+                tags: FrozenSet[str]) -> 'ResourceKey':
+        """Retrieve the shared instance for a validated set of components,
+        creating it if it was not seen before.
+
+        Entity values are positional, following `supported_entities`, and
+        None marks an entity that is not set."""
+
+        identity = (suffix, strategy, values, tags)
+
+        resource_key = cls._interned.get(identity)
+        if resource_key is None:
+            resource_key = super().__new__(cls)
+            resource_key._suffix = suffix
+            resource_key._strategy = strategy
+            resource_key._values = values
+            resource_key._tags = tags
+            resource_key._str = cls._format(suffix, strategy, values)
+            resource_key._entities = None
+            resource_key._matcher = None
+            resource_key._sort_key = None
+            resource_key._hash = None
+            resource_key._int_hash = None
+            cls._interned[identity] = resource_key
+
+        return resource_key
+
+    @classmethod
+    def _format(cls,
+                suffix: str,
+                strategy: Strategy,
+                values: Tuple[Optional[str], ...]) -> str:
+        """Create a string representation of the key components.
 
-        if self.strategy != other.strategy:
+        The representation is compatible with BIDS. It prepares
+        the `desc` field in case that there is an strategy in place.
+        """
+        desc_position = cls._positions['desc']
+        parts = [
+            f'{entity}{ResourceKey.KEYVAL_SEP}{value}'
+            for position, (entity, value) in enumerate(zip(cls.supported_entities, values))
+            if value is not None and position != desc_position
+        ]
 
-            other_strategy = other.strategy
-            self_strategy_keys = set(self.strategy.keys())
-            other_strategy_keys = set(other_strategy.keys())
+        desc = ResourceKey.STRAT_SEP.join(filter(None, [
+            values[desc_position] or '',
+            strategy._str
+        ]))
+        if desc:
+            parts.append(f'desc{ResourceKey.KEYVAL_SEP}{desc}')
 
-            if not self_strategy_keys.issubset(other_strategy_keys) and \
-                not other_strategy_keys.issubset(self_strategy_keys):
-                raise ValueError(f'Strategy are not subsets: {self_strategy_keys} '
-                                 f'and {other_strategy_keys}')
+        if suffix:
+            parts.append(suffix)
 
-            return self.strategy < other.strategy
+        return ResourceKey.ENTITY_SEP.join(parts)
 
-        other_entities = other.entities
+    def __reduce__(self):
+        return ResourceKey._intern, (self._suffix, self._strategy, self._values, self._tags)
 
-        self_entities_keys = set(self._entities.keys())
-        other_entities_keys = set(other_entities.keys())
+    @property
+    def sort_key(self) -> Tuple:
+        """Retrieve the ordering key, computed once.
+
+        Keys are ordered by suffix, then by strategy, in which earlier
+        strategies (with less forks) are lesser than new strategies, then
+        by entity values, in the order of `supported_entities`, in which
+        an entity that is not set is lesser than any value. Tags break
+        the remaining ties, so the order is total.
+        """
+        if self._sort_key is None:
+            self._sort_key = (
+                self._suffix,
+                len(self._strategy),
+                self._strategy._forks,
+                tuple(value if value is not None else '' for value in self._values),
+                tuple(sorted(self._tags)),
+            )
+        return self._sort_key
 
-        if not self_entities_keys.issubset(other_entities_keys) and \
-            not other_entities_keys.issubset(self_entities_keys):
-            raise ValueError(f'Entities are not subsets: {self_entities_keys} '
-                             f'and {other_entities_keys}')
+    def __lt__(self, other: 'ResourceKey') -> bool:
+        """Compare ResourceKeys based on their sort key.
 
-        for k, v in self._entities.items():
-            if k not in other_entities:
-                return False
-            if v != other_entities[k]:
-                return v < other_entities[k]
+        Args:
+            other: ResourceKey to be compared to.
 
-        return len(self._entities) < len(other_entities)
+        Returns:
+            True if object is considered lesser than other.
+            False otherwise.
+        """
+        return self.sort_key < other.sort_key
 
     def __hashcontent__(self) -> Any:
         """Create a reliable set of tuples and strings used
@@ -318,46 +551,48 @@ class ResourceKey(Hashable):
             self._suffix,
             self._strategy.__hashcontent__(),
             tuple(
-                (entity, self._entities[entity])
-                for entity in self.supported_entities
-                if entity in self._entities
+                (entity, value)
+                for entity, value in zip(self.supported_entities, self._values)
+                if value is not None
             ),
-            tuple(self._tags),
+            tuple(sorted(self._tags)),
         )
 
+    def __hash__(self) -> int:
+        """Hash the key components for in-process mappings, while
+        __longhash__ remains the deterministic hash."""
+        if self._int_hash is None:
+            self._int_hash = hash((self._suffix, self._strategy._forks, self._values, self._tags))
+        return self._int_hash
+
+    def __eq__(self, other: Any) -> bool:
+        if self is other:
+            return True
+        if isinstance(other, ResourceKey):
+            return \
+                self._values == other._values and \
+                self._suffix == other._suffix and \
+                self._strategy == other._strategy and \
+                self._tags == other._tags
+        return super().__eq__(other)
+
     def __repr__(self) -> str:
         """Use __str__ representation as official repr"""
-        return str(self)
+        return self._str
 
     def __str__(self) -> str:
-        """Create a string representation of the key.
-
-        The representation is compatible with BIDS. It prepares
-        the `desc` field in case that there is an strategy in place.
-        """
-        desc = ResourceKey.STRAT_SEP.join(filter(None, [
-            self._entities.get('desc', ''),
-            str(self._strategy)
-        ]))
-        if desc:
-            desc = f'desc{ResourceKey.KEYVAL_SEP}{desc}'
-
-        return ResourceKey.ENTITY_SEP.join(filter(None,
-                                                  [
-                                                      ResourceKey.KEYVAL_SEP.join([entity, self._entities[entity]])
-                                                      for entity in self.supported_entities
-                                                      if entity in self._entities and entity != 'desc'
-                                                  ]
-                                                  +
-                                                  ([desc] if desc else [])
-                                                  +
-                                                  [self._suffix]
-                                                  ))
+        """Retrieve the string representation of the key, computed
+        once when the key is created."""
+        return self._str
 
     def keys(self) -> List[str]:
         """Get a list of keys of defined entities and strategy."""
         return \
-            list(self._entities.keys()) + \
+            [
+                entity
+                for entity, value in zip(self.supported_entities, self._values)
+                if value is not None
+            ] + \
             ['suffix'] + \
             (['strategy'] if self._strategy else [])
 
@@ -378,11 +613,15 @@ class ResourceKey(Hashable):
         if item == 'strategy':
             return self._strategy
 
-        if item not in self.supported_entities:
+        if item not in self._positions:
             raise KeyError(f'Entity {item} is not supported '
                            f'by the resource pool')
 
-        return self._entities[item]
+        value = self._values[self._positions[item]]
+        if value is None:
+            raise KeyError(item)
+
+        return value
 
     def __contains__(self, key: Union[str, 'ResourceKey']) -> bool:
         """Assess if a key is a subset of it.
@@ -401,39 +640,15 @@ class ResourceKey(Hashable):
             False
         """
 
-        key = ResourceKey(key)
-
-        if self._suffix != '*' and self._suffix != key.suffix:
-            return False
-
-        for entity, value in self._entities.items():
-            if value == '^':
-                if entity in key._entities:
-                    return False
-            else:
-
-                if entity not in key._entities:
-                    continue
-
-                if value == '*':
-                    continue
-
-                if value != key._entities[entity]:
-                    return False
-
-        my_strat = self.strategy
-        key_strat = key.strategy
-
-        if my_strat not in key_strat:
-            return False
-
-        if self.tags:
-            if not key._tags:
-                return False
-            if not all(tag in key.tags for tag in self._tags):
-                return False
+        return self.matcher(ResourceKey(key))
 
-        return True
+    @property
+    def matcher(self) -> 'ResourceKeyMatcher':
+        """Retrieve the compiled matcher of this key as a filter.
+        It is compiled once and shared by every lookup."""
+        if self._matcher is None:
+            self._matcher = ResourceKeyMatcher(self)
+        return self._matcher
 
     @property
     def suffix(self) -> str:
@@ -441,23 +656,26 @@ class ResourceKey(Hashable):
         return self._suffix
 
     @property
-    def tags(self) -> Set[str]:
-        """Retrieve a copy of the tags."""
-        return self._tags.copy()
+    def tags(self) -> FrozenSet[str]:
+        """Retrieve the tags."""
+        return self._tags
 
     @property
     def strategy(self) -> Strategy:
-        """Retrieve the strategy. An empty strategy will be
-        created if not set."""
-        if not self._strategy:
-            return Strategy({})
-
+        """Retrieve the strategy. The shared empty strategy
+        is used if not set."""
         return self._strategy
 
     @property
-    def entities(self) -> Dict[str, str]:
-        """Retrieve a copy of entities."""
-        return self._entities.copy()
+    def entities(self) -> Mapping[str, str]:
+        """Retrieve a read-only mapping of entities."""
+        if self._entities is None:
+            self._entities = MappingProxyType({
+                entity: value
+                for entity, value in zip(self.supported_entities, self._values)
+                if value is not None
+            })
+        return self._entities
 
     def isfilter(self) -> bool:
         """Check if key is a filter.
@@ -468,12 +686,7 @@ class ResourceKey(Hashable):
             True, if an entity or suffix is a quantifier.
             False, otherwise.
         """
-        return \
-            any(
-                v in ['*', '^']
-                for v in self._entities.values()
-            ) or \
-            self._suffix == '*'
+        return '*' in self._values or '^' in self._values or self._suffix == '*'
 
     def isbroad(self) -> bool:
         """Check if key is a broad key (*).
@@ -483,19 +696,144 @@ class ResourceKey(Hashable):
             False, otherwise.
         """
         return \
-            len(self._entities) == 0 and \
-            self._suffix == '*'
+            self._suffix == '*' and \
+            not any(self._values)
+
+
+class ResourceKeyMatcher:
+    """Compiled form of a ResourceKey used as a filter.
+
+    The filter is split into a suffix check, the positions of entities that
+    must match when present, the positions of entities that must be absent
+    (`^`), a strategy subset test and a tag subset test. Wildcard entities
+    (`*`) match any key, so they are not checked. Strategy tests are
+    memoised by candidate strategy, since strategies are interned and few.
+    """
+
+    __slots__ = ('_suffix', '_equal', '_forbidden',
+                 '_strategy', '_tags', '_strategies')
+
+    def __init__(self, key: ResourceKey):
+        self._suffix = key._suffix if key._suffix != '*' else None
+        self._equal = tuple(
+            (position, value)
+            for position, value in enumerate(key._values)
+            if value is not None and value != '*' and value != '^'
+        )
+        self._forbidden = tuple(
+            position
+            for position, value in enumerate(key._values)
+            if value == '^'
+        )
+        self._strategy = key._strategy
+        self._tags = key._tags
+        self._strategies = {}
+
+    def _strategy_match(self, strategy: Strategy) -> bool:
+        match = self._strategies.get(strategy)
+        if match is None:
+            match = self._strategies[strategy] = self._strategy in strategy
+        return match
+
+    def __call__(self, key: ResourceKey) -> bool:
+        """Assess if `key` is matched by the filter."""
+
+        if self._suffix is not None and self._suffix != key._suffix:
+            return False
+
+        values = key._values
+
+        for position in self._forbidden:
+            if values[position] is not None:
+                return False
+
+        for position, value in self._equal:
+            key_value = values[position]
+            if key_value is not None and key_value != value:
+                return False
+
+        if self._strategy and not self._strategy_match(key._strategy):
+            return False
+
+        if self._tags and not self._tags <= key._tags:
+            return False
+
+        return True
+
+    def filter(self, keys: Iterable[ResourceKey]) -> List[ResourceKey]:
+        """Evaluate the filter over a batch of keys.
+
+        Args:
+            keys: Keys to be evaluated.
+
+        Returns:
+            The keys matched by the filter, in the same order.
+        """
+        suffix = self._suffix
+        forbidden = self._forbidden
+        equal = self._equal
+        strategy = self._strategy
+        strategy_match = self._strategy_match
+        tags = self._tags
+
+        matched = []
+        for key in keys:
+            if suffix is not None and suffix != key._suffix:
+                continue
+
+            values = key._values
+
+            if forbidden and any(values[position] is not None for position in forbidden):
+                continue
+
+            if equal and any(
+                values[position] is not None and values[position] != value
+                for position, value in equal
+            ):
+                continue
+
+            if strategy and not strategy_match(key._strategy):
+                continue
+
+            if tags and not tags <= key._tags:
+                continue
+
+            matched.append(key)
+
+        return matched
+
+    def mask(self, keys: Iterable[ResourceKey]) -> List[bool]:
+        """Evaluate the filter over a batch of keys.
+
+        Args:
+            keys: Keys to be evaluated.
+
+        Returns:
+            A list of booleans, True for every key matched by the filter.
+        """
+        keys = list(keys)
+        matched = set(map(id, self.filter(keys)))
+        return [id(key) in matched for key in keys]
 
 
 class Resource(Hashable):
+    __slots__ = ('_content', '_hash')
 
     def __init__(self, content: Any):
         self._content = content
+        self._hash = None
 
     def __copy__(self) -> 'Resource':
         return Resource(self._content)
 
     def __hashcontent__(self) -> Tuple:
+        # Local files contribute a fingerprint of their content, so jobs
+        # which read them change when they are replaced in place. Relative
+        # contents are parameters, they do not depend on the directory
+        if isinstance(self._content, (str, PurePath)) and os.path.isabs(self._content):
+            content_fingerprint = fingerprint(self._content)
+            if content_fingerprint is not None:
+                return self._content, content_fingerprint
         return self._content,
 
     def __str__(self) -> str:
@@ -518,9 +856,9 @@ class Resource(Hashable):
 class InvalidResource(Resource):
 
     def __init__(self, resource: Resource, exception: Exception = None):
+        super().__init__(None)
         self._resource = resource
         self._exception = exception
-        self._content = None
 
     def __hashcontent__(self) -> Tuple:
         return self._resource, self._exception
@@ -535,38 +873,238 @@ class InvalidResource(Resource):
 
 
 class ResourcePool:
+    """Mapping of ResourceKeys to Resources.
+
+    Besides the main mapping, the pool keeps posting indexes, updated on
+    insertion, for suffixes, tags, entity values and strategy forks. Each
+    posting maps the keys that hold that value to their resources, in
+    insertion order. Since filters also match keys which do not have their
+    entities or forks, the keys without each entity and fork are indexed as
+    well. Filter queries are narrowed down to the most selective posting
+    and then evaluated by the filter matcher.
+
+    Snapshots share the storage and indexes of the pool they come from, and
+    both copy them on their first write. Filtered views hold the keys they
+    match, and read through the indexes of the pool they come from, which
+    only grow, so the pool does not need to copy anything on its writes.
+    """
+
     _pool: Dict[ResourceKey, Resource]
     _pool_by_type: Dict[str, Dict[ResourceKey, Resource]]
     _pool_by_tag: Dict[str, Dict[ResourceKey, Resource]]
-    _pool_branches: Dict[str, Set[str]]
+    _pool_by_entity: Dict[str, Dict[str, Dict[ResourceKey, Resource]]]
+    _pool_by_fork: Dict[str, Dict[str, Dict[ResourceKey, Resource]]]
+    _pool_without_entity: Dict[str, Dict[ResourceKey, Resource]]
+    _pool_without_fork: Dict[str, Dict[ResourceKey, Resource]]
     _pool_branched_resources: Dict[str, Set[ResourceKey]]
+    _shared: bool
+    _filters: Tuple[ResourceKey, ...]
+    _view: Optional[Dict[ResourceKey, Resource]]
 
     def __init__(self):
         self._pool = {}
         self._pool_by_type = {}
         self._pool_by_tag = {}
-        self._pool_branches = {
-            entity: set()
-            for entity in ResourceKey.branching_entities
+        self._pool_by_entity = {
+            entity: {}
+            for entity in ResourceKey.supported_entities
         }
+        self._pool_by_fork = {}
+        self._pool_without_entity = {
+            entity: {}
+            for entity in ResourceKey.supported_entities
+        }
+        self._pool_without_fork = {}
         self._pool_branched_resources = {
             entity: set()
             for entity in ResourceKey.branching_entities
         }
+        self._shared = False
+        self._filters = ()
+        self._view = None
 
     def __iter__(self) -> Iterator[Tuple[ResourceKey, Resource]]:
-        return iter(self._pool.items())
+        return iter(self._items().items())
+
+    def __len__(self) -> int:
+        return len(self._items())
 
     def __contains__(self, key: ResourceKey) -> bool:
-        for rp_key in self._pool:
-            if rp_key in key:
-                return True
-        return False
+        key = ResourceKey(key)
+        matcher = key.matcher
+        items = self._items()
+        return any(matcher(rp_key) for rp_key in self._candidates(key) if rp_key in items)
 
     @property
     def raw(self):
+        return self._items()
+
+    def snapshot(self) -> 'ResourcePool':
+        """Create a copy of the pool in constant time.
+
+        The copy shares the storage and indexes with this pool, and both
+        copy them on their next write, so changes to one of them are never
+        seen by the other.
+
+        Returns:
+            A new ResourcePool.
+        """
+        self._shared = True
+        return copy.copy(self)
+
+    def view(self, key: Union[ResourceKey, str]) -> 'ResourcePool':
+        """Create a copy of the pool restricted to the resources matched by
+        the filter `key`, in time proportional to the matches.
+
+        Reads go through the indexes of this pool, restricted to the matched
+        keys, so later writes to this pool are not seen by the view. The
+        view builds its own storage, with the matched resources only, when
+        it is written or extracted.
+
+        Args:
+            key: Filter.
+
+        Returns:
+            A new ResourcePool.
+        """
+        key = ResourceKey(key)
+        items = self._items()
+        view = copy.copy(self)
+        view._filters = self._filters + (key,)
+        view._view = {k: items[k] for k in self._select(key)}
+        return view
+
+    def _items(self) -> Dict[ResourceKey, Resource]:
+        """Retrieve the resources visible from the pool, which are the
+        matched resources in case of a view."""
+        if self._filters:
+            return self._view
         return self._pool
 
+    def _restrict(self, posting: Dict[ResourceKey, Resource]) -> Dict[ResourceKey, Resource]:
+        """Restrict a posting to the resources visible from the pool."""
+        if not self._filters:
+            return posting
+        items = self._items()
+        return {k: v for k, v in posting.items() if k in items}
+
+    def _materialize(self) -> None:
+        """Turn a view into a pool with its own storage and indexes."""
+        resources = self._items()
+        self.__init__()
+        self._pool.update(resources)
+        self._index(resources)
+
+    def _own(self) -> None:
+        """Make sure the storage is not shared before modifying it."""
+        if self._filters:
+            self._materialize()
+            return
+
+        if not self._shared:
+            return
+
+        self._pool = dict(self._pool)
+        self._pool_by_type = {
+            suffix: dict(posting)
+            for suffix, posting in self._pool_by_type.items()
+        }
+        self._pool_by_tag = {
+            tag: dict(posting)
+            for tag, posting in self._pool_by_tag.items()
+        }
+        self._pool_by_entity = {
+            entity: {value: dict(posting) for value, posting in postings.items()}
+            for entity, postings in self._pool_by_entity.items()
+        }
+        self._pool_by_fork = {
+            fork: {value: dict(posting) for value, posting in postings.items()}
+            for fork, postings in self._pool_by_fork.items()
+        }
+        self._pool_without_entity = {
+            entity: dict(posting)
+            for entity, posting in self._pool_without_entity.items()
+        }
+        self._pool_without_fork = {
+            fork: dict(posting)
+            for fork, posting in self._pool_without_fork.items()
+        }
+        self._pool_branched_resources = {
+            entity: set(resources)
+            for entity, resources in self._pool_branched_resources.items()
+        }
+        self._shared = False
+
+    @staticmethod
+    def _smallest(postings: List[Tuple[Dict[ResourceKey, Resource], ...]]) -> Iterable[ResourceKey]:
+        """Retrieve the keys of the smallest posting, given as the postings
+        whose union holds it."""
+        parts = min(postings, key=lambda parts: sum(map(len, parts)))
+        if len(parts) == 1:
+            return parts[0]
+        return itertools.chain(*parts)
+
+    def _candidates(self, key: ResourceKey) -> Iterable[ResourceKey]:
+        """Retrieve the keys of the smallest posting that contains every key
+        matched by the filter `key`. In case of a view, the keys in the
+        posting might not be visible.
+
+        The result still needs to be evaluated by the filter matcher.
+        """
+        postings = self._postings(key)
+        if self._filters:
+            postings.append((self._items(),))
+        return self._smallest(postings)
+
+    def _postings(self, key: ResourceKey) -> List[Tuple[Dict[ResourceKey, Resource], ...]]:
+        """Retrieve the stored postings that contain every key matched by
+        the filter `key`, each one as the postings whose union holds it.
+
+        Suffixes and tags must be present in the matched keys. Entities and
+        strategy forks only need to match when the key has them, so their
+        postings are completed with the keys without them. Forbidden
+        entities are only absent from the matched keys.
+        """
+        pool = self._pool
+
+        postings = [(pool,)]
+
+        if key._suffix != '*':
+            postings.append((self._pool_by_type.get(key._suffix, {}),))
+
+        for tag in key._tags:
+            postings.append((self._pool_by_tag.get(tag, {}),))
+
+        matcher = key.matcher
+        for position, value in matcher._equal:
+            entity = ResourceKey.supported_entities[position]
+            postings.append((
+                self._pool_by_entity[entity].get(value, {}),
+                self._pool_without_entity[entity],
+            ))
+
+        for position in matcher._forbidden:
+            entity = ResourceKey.supported_entities[position]
+            postings.append((self._pool_without_entity[entity],))
+
+        for fork, value in key._strategy:
+            # Every key is without a fork which is not in the pool
+            postings.append((
+                self._pool_by_fork.get(fork, {}).get(value, {}),
+                self._pool_without_fork.get(fork, pool),
+            ))
+
+        return postings
+
+    def _select(self, key: ResourceKey) -> List[ResourceKey]:
+        """Retrieve the keys matched by the filter `key`. Keys holding the
+        entities and forks of the filter come first, in insertion order."""
+        keys = key.matcher.filter(self._candidates(key))
+        if self._filters:
+            items = self._items()
+            keys = [k for k in keys if k in items]
+        return keys
+
     def __getitem__(self, key: Union[ResourceKey, str, List[str]]) -> Union[Resource, Dict]:
 
         if isinstance(key, list):
@@ -575,29 +1113,28 @@ class ResourcePool:
         if isinstance(key, ResourceKey):
 
             if key.isfilter():
-                rp = ResourcePool()
-
-                for rkey in self._pool:
-                    if rkey not in key:
-                        continue
-                    rp[rkey] = self[rkey]
-
-                return rp
+                return self.view(key)
 
             try:
-                return self._pool[key]
+                return self._items()[key]
             except KeyError:
-                return self._pool[next(iter(sorted([
-                    k
-                    for k in self._pool
-                    if k in key
-                ], reverse=True)))]
+                pass
+
+            matches = self._select(key)
+            if not matches:
+                raise KeyError(f'Key "{key}" not found')
+
+            return self._pool[max(matches, key=operator.attrgetter('sort_key'))]
 
         if key in self._pool_by_type:
-            return self._pool_by_type[key]
+            posting = self._restrict(self._pool_by_type[key])
+            if posting:
+                return posting
 
         if key in self._pool_by_tag:
-            return self._pool_by_tag[key]
+            posting = self._restrict(self._pool_by_tag[key])
+            if posting:
+                return posting
 
         raise KeyError(f'Key "{key}" not find in suffixes or tags')
 
@@ -609,53 +1146,202 @@ class ResourcePool:
         if resource_key.isfilter():
             raise KeyError(f'Resource key cannot be a filter: {resource_key}')
 
+        self._own()
+
+        if resource_key in self._pool:
+            raise KeyError(f'Resource key {resource_key} already '
+                           f'exists in the pool.')
+
         if not isinstance(resource, Resource):
             resource = Resource(resource)
 
         self._pool[resource_key] = resource
+        self._index({resource_key: resource})
 
-        if resource_key['suffix'] not in self._pool_by_type:
-            self._pool_by_type[resource_key['suffix']] = {}
+    @classmethod
+    def from_items(cls, items: Iterable[Union[Tuple[Union[ResourceKey, str], Any], str, os.PathLike, Resource]]) \
+            -> 'ResourcePool':
+        """Create a resource pool from many resources at once.
 
-        if resource_key in self._pool_by_type[resource_key['suffix']]:
-            raise KeyError(f'Resource key {resource_key} already '
-                           f'exists in the pool.')
+        Args:
+            items: Resources to insert, as described in `update`.
+
+        Returns:
+            A new ResourcePool.
+        """
+        resource_pool = cls()
+        resource_pool.update(items)
+        return resource_pool
 
-        self._pool_by_type[resource_key['suffix']][resource_key] = resource
+    def update(self, items: Iterable[Union[Tuple[Union[ResourceKey, str], Any], str, os.PathLike, Resource]]) -> None:
+        """Insert many resources at once.
 
-        cleaner = {en: None for en in ResourceKey.branching_entities}
-        clean_resource_key = ResourceKey(
-            resource_key,
-            **cleaner
-        )
-        for entity in ResourceKey.branching_entities:
-            if entity in resource_key.entities:
-                self._pool_branches[entity].add(resource_key[entity])
-                self._pool_branched_resources[entity].add(clean_resource_key)
+        Keys are parsed and validated for the whole batch before the pool is
+        modified, and the indexes are built in a single pass. If any key is
+        invalid, a filter, duplicated in the batch or already in the pool,
+        nothing is inserted.
+
+        Args:
+            items: Pairs of key and resource, or BIDS file paths. Paths can
+                be strings, path-like objects or file Resources, such as
+                S3Resources, and are keyed by their file name, without
+                extensions.
+
+        Raises:
+            KeyError: A key is a filter, duplicated or already exists.
+        """
+
+        names = []
+        resources = []
+
+        for item in items:
+            if isinstance(item, tuple):
+                resource_key, resource = item
+            else:
+                if isinstance(item, Resource):
+                    resource = item
+                    path = str(item.content)
+                else:
+                    path = os.fspath(item)
+                    resource = Resource(path)
+                resource_key = os.path.basename(path).split('.')[0]
+
+            if not isinstance(resource, Resource):
+                resource = Resource(resource)
+
+            names.append(resource_key)
+            resources.append(resource)
+
+        parsed = iter(ResourceKey._parse([
+            str(k) for k in names if not isinstance(k, ResourceKey)
+        ]))
+        keys = [
+            k if isinstance(k, ResourceKey) else next(parsed)
+            for k in names
+        ]
+
+        filters = [k for k in keys if k.isfilter()]
+        if filters:
+            raise KeyError(f'Resource keys cannot be filters: {filters}')
+
+        batch = dict(zip(keys, resources))
+
+        if len(batch) != len(keys):
+            seen = set()
+            duplicated = {k for k in keys if k in seen or seen.add(k)}
+            raise KeyError(f'Resource keys are duplicated: {sorted(duplicated, key=str)}')
+
+        self._own()
+
+        existing = [k for k in batch if k in self._pool]
+        if existing:
+            raise KeyError(f'Resource keys already exist in the pool: {existing}')
+
+        self._pool.update(batch)
+        self._index(batch)
 
-        for flag in resource_key.tags:
-            if flag not in self._pool:
-                self._pool_by_tag[flag] = {}
-            self._pool_by_tag[flag][resource_key] = resource
+    def _index(self, resources: Dict[ResourceKey, Resource]) -> None:
+        """Add keys, already stored in the pool, to the posting indexes."""
+
+        pool_by_type = self._pool_by_type
+        pool_by_tag = self._pool_by_tag
+        pool_by_entity = [
+            self._pool_by_entity[entity]
+            for entity in ResourceKey.supported_entities
+        ]
+        pool_by_fork = self._pool_by_fork
+
+        branching_positions = [
+            ResourceKey._positions[entity]
+            for entity in ResourceKey.branching_entities
+        ]
+        branching_mask = frozenset(branching_positions)
+        without_entity = [
+            self._pool_without_entity[entity]
+            for entity in ResourceKey.supported_entities
+        ]
+        without_fork = list(self._pool_without_fork.items())
+        new_forks = set()
+        clean_keys = {}
+
+        for resource_key, resource in resources.items():
+
+            pool_by_type.setdefault(resource_key._suffix, {})[resource_key] = resource
+
+            for flag in resource_key._tags:
+                pool_by_tag.setdefault(flag, {})[resource_key] = resource
+
+            for position, value in enumerate(resource_key._values):
+                if value is None:
+                    without_entity[position][resource_key] = resource
+                    continue
+                pool_by_entity[position].setdefault(value, {})[resource_key] = resource
+
+            forks = resource_key._strategy._mapping
+            for fork, value in resource_key._strategy:
+                if fork not in pool_by_fork:
+                    new_forks.add(fork)
+                pool_by_fork.setdefault(fork, {}).setdefault(value, {})[resource_key] = resource
+
+            for fork, posting in without_fork:
+                if fork not in forks:
+                    posting[resource_key] = resource
+
+            values = resource_key._values
+
+            if any(values[position] is not None for position in branching_positions):
+                clean_values = tuple([
+                    None if position in branching_mask else value
+                    for position, value in enumerate(values)
+                ])
+                identity = (resource_key._suffix, resource_key._strategy, clean_values, resource_key._tags)
+                if identity not in clean_keys:
+                    clean_keys[identity] = ResourceKey._intern(*identity)
+                clean_resource_key = clean_keys[identity]
+
+                for entity, position in zip(ResourceKey.branching_entities, branching_positions):
+                    if values[position] is not None:
+                        self._pool_branched_resources[entity].add(clean_resource_key)
+
+        # Keys stored before a fork first appears are all without it
+        for fork in new_forks:
+            self._pool_without_fork[fork] = {
+                k: v
+                for k, v in self._pool.items()
+                if fork not in k._strategy._mapping
+            }
 
     def __str__(self):
-        return str(self._pool)
+        return str(self._items())
+
+    def _extraction_plan(self, resources: List[ResourceKey]) -> Tuple[
+        Dict[ResourceKey, List[ResourceKey]],
+        List[str], List[List[str]],
+        List[str], List[List[str]],
+    ]:
+        """Select the resources matched by each selector and the
+        dimensions of the extraction.
+
+        Args:
+            resources: Resource selectors.
+
+        Returns:
+            The keys matched by each selector, the branching entities and
+            their values, and the strategy forks and their values.
+        """
 
-    def extract(self, *resources: Union[ResourceKey, str]):
+        if self._filters:
+            self._materialize()
 
         extracted_resources = {}
         strategies = {}
 
-        resources = [ResourceKey(r) for r in resources]
-
         too_broad_resources = [r for r in resources if r.isbroad()]
         if too_broad_resources:
             raise KeyError(f'Extracted resource keys too broad: {too_broad_resources}')
 
         for resource in resources:
-            extracted_resources[resource] = [
-                r for r in self._pool if r in resource
-            ]
+            extracted_resources[resource] = self._select(resource)
 
             for matching in extracted_resources[resource]:
                 for strategy, name in matching.strategy:
@@ -665,11 +1351,11 @@ class ResourcePool:
 
         # Branching
         expected_branching_keys = [
-            b for b in self._pool_branches
+            b for b in ResourceKey.branching_entities
             if
 
             # there is branching in this entity
-            self._pool_branches[b] and
+            self._pool_by_entity[b] and
 
             # all resource selectors for this entity are not wildcards
             all(
@@ -684,10 +1370,50 @@ class ResourcePool:
             )
         ]
         expected_branching_values_set = [
-            self._pool_branches[b] for b in expected_branching_keys
+            list(self._pool_by_entity[b]) for b in expected_branching_keys
         ]
 
-        strategies_keys, strategies_values_set = list(strategies.keys()), list(strategies.values())
+        strategies_keys = list(strategies.keys())
+        strategies_values_set = [list(v) for v in strategies.values()]
+
+        return (
+            extracted_resources,
+            expected_branching_keys, expected_branching_values_set,
+            strategies_keys, strategies_values_set,
+        )
+
+    def extract(self, *resources: Union[ResourceKey, str]) -> 'ResourcePoolExtraction':
+        """Extract groups of resources that share branching entities and
+        strategy, one group for each combination that every selector
+        can fulfill.
+
+        Groups are streamed: the extraction is planned up front, and each
+        group is built when it is reached. The number of groups is
+        available through `len` before iterating, and `chunks` batches
+        the groups.
+
+        Args:
+            resources: Resource selectors.
+
+        Returns:
+            A ResourcePoolExtraction, which yields the key of each group,
+            with its branching entities and strategy, and a
+            StrategyResourcePool proxy for the group.
+        """
+        return ResourcePoolExtraction(self, [ResourceKey(r) for r in resources])
+
+    def _extract_product(self, *resources: Union[ResourceKey, str]):
+        """Reference implementation of `extract`, which tests every
+        combination in the product of branching values and strategies.
+
+        It is kept to check the equivalence of `extract`.
+        """
+
+        resources = [ResourceKey(r) for r in resources]
+
+        extracted_resources, \
+            expected_branching_keys, expected_branching_values_set, \
+            strategies_keys, strategies_values_set = self._extraction_plan(resources)
 
         for grouping_values in itertools.product(*expected_branching_values_set, *strategies_values_set):
 
@@ -724,9 +1450,7 @@ class ResourcePool:
                     **expected_resource_unbranching
                 )
 
-                strategy_extracted_resources = [
-                    e for e in extracted if e in resource_filter
-                ]
+                strategy_extracted_resources = resource_filter.matcher.filter(extracted)
 
                 if strategy_extracted_resources:
 
@@ -757,17 +1481,190 @@ class ResourcePool:
                 )
                 yield strategy_key, StrategyResourcePool(strategy_key, self)
 
-            # """
+
+class ResourcePoolExtraction:
+    """Lazy extraction of groups from a ResourcePool.
+
+    Each key matched by a selector is projected onto the branching entities
+    and strategy forks, and the projections of the selectors are joined, so
+    only existing combinations are enumerated. Dimensions left unset by the
+    join are expanded with all their values, since a key without an entity
+    or fork applies to all of its values.
+
+    The join is computed when the extraction is created; groups are built
+    while iterating.
+    """
+
+    def __init__(self, resource_pool: ResourcePool, resources: List[ResourceKey]):
+        self._resource_pool = resource_pool
+
+        extracted_resources, \
+            self._branching_keys, branching_values_set, \
+            self._strategies_keys, strategies_values_set = resource_pool._extraction_plan(resources)
+
+        branching_positions = [ResourceKey._positions[b] for b in self._branching_keys]
+        self._domains = branching_values_set + strategies_values_set
+
+        joined = {(None,) * len(self._domains)}
+        for extracted in extracted_resources.values():
+            projections = {
+                tuple(key._values[position] for position in branching_positions) +
+                tuple(key._strategy._mapping.get(strategy) for strategy in self._strategies_keys)
+                for key in extracted
+            }
+            joined = self._join(joined, projections)
+            if not joined:
+                break
+
+        ranks = [
+            {value: rank for rank, value in enumerate(domain)}
+            for domain in self._domains
+        ]
+        self._assignments = sorted(joined, key=lambda assignment: tuple(
+            rank[value] if value is not None else -1
+            for rank, value in zip(ranks, assignment)
+        ))
+
+        # assignments setting the same dimensions never expand to the same
+        # combination, otherwise combinations must be deduplicated
+        self._disjoint = len({
+            self._unset(assignment)
+            for assignment in self._assignments
+        }) <= 1
+
+        self._count = None
+
+    @staticmethod
+    def _unset(assignment: Tuple[Optional[str], ...]) -> Tuple[int, ...]:
+        return tuple(i for i, v in enumerate(assignment) if v is None)
+
+    @staticmethod
+    def _join(left: Set[Tuple[Optional[str], ...]],
+              right: Set[Tuple[Optional[str], ...]]) -> Set[Tuple[Optional[str], ...]]:
+        """Hash-join two sets of partial assignments.
+
+        Assignments are tuples over the same dimensions, in which None is
+        an unset dimension that is compatible with any value. Assignments
+        are grouped by the dimensions they set, and each pair of groups is
+        joined on the dimensions both of them set.
+        """
+
+        def groups(assignments):
+            grouped = {}
+            for assignment in assignments:
+                dimensions = tuple(i for i, v in enumerate(assignment) if v is not None)
+                grouped.setdefault(dimensions, []).append(assignment)
+            return grouped
+
+        left_groups, right_groups = groups(left), groups(right)
+
+        joined = set()
+        for right_dimensions, right_group in right_groups.items():
+            indexes = {}
+            for left_dimensions, left_group in left_groups.items():
+                common = tuple(i for i in left_dimensions if i in right_dimensions)
+
+                if common not in indexes:
+                    index = indexes[common] = {}
+                    for assignment in right_group:
+                        index.setdefault(tuple(assignment[i] for i in common), []).append(assignment)
+                index = indexes[common]
+
+                for assignment in left_group:
+                    for other in index.get(tuple(assignment[i] for i in common), ()):
+                        joined.add(tuple(
+                            value if value is not None else other_value
+                            for value, other_value in zip(assignment, other)
+                        ))
+
+        return joined
+
+    def _combinations(self) -> Iterator[Tuple[str, ...]]:
+        seen = None if self._disjoint else set()
+
+        for assignment in self._assignments:
+            for combination in itertools.product(*[
+                [value] if value is not None else domain
+                for value, domain in zip(assignment, self._domains)
+            ]):
+                if seen is not None:
+                    if combination in seen:
+                        continue
+                    seen.add(combination)
+                yield combination
+
+    def _group(self, combination: Tuple[str, ...]) -> Tuple[ResourceKey, 'StrategyResourcePool']:
+        branching_values = combination[:len(self._branching_keys)]
+        strategies_values = combination[len(self._branching_keys):]
+
+        expected_branching = dict(zip(self._branching_keys, branching_values))
+        strategy_combination = Strategy(zip(self._strategies_keys, strategies_values))
+
+        expected_strategy_combination = {}
+        if strategy_combination:
+            expected_strategy_combination['strategy'] = strategy_combination
+
+        strategy_key = ResourceKey(
+            **expected_strategy_combination,
+            **expected_branching,
+            suffix='*'
+        )
+        return strategy_key, StrategyResourcePool(strategy_key, self._resource_pool)
+
+    def __len__(self) -> int:
+        """Retrieve the number of groups, without building them."""
+        if self._count is None:
+            if self._disjoint:
+                self._count = sum(
+                    functools.reduce(operator.mul, (
+                        len(self._domains[i])
+                        for i in self._unset(assignment)
+                    ), 1)
+                    for assignment in self._assignments
+                )
+            else:
+                self._count = sum(1 for _ in self._combinations())
+        return self._count
+
+    def __iter__(self) -> Iterator[Tuple[ResourceKey, 'StrategyResourcePool']]:
+        for combination in self._combinations():
+            yield self._group(combination)
+
+    def chunks(self, size: int) -> Iterator[List[Tuple[ResourceKey, 'StrategyResourcePool']]]:
+        """Stream the groups in batches.
+
+        Args:
+            size: Maximum number of groups in each batch.
+
+        Yields:
+            Lists of groups, as yielded by iterating the extraction.
+        """
+        if size < 1:
+            raise ValueError(f'Chunk size must be positive, provided: {size}')
+
+        chunk = []
+        for group in self:
+            chunk.append(group)
+            if len(chunk) == size:
+                yield chunk
+                chunk = []
+
+        if chunk:
+            yield chunk
 
 
 class StrategyResourcePool:
     """
     A non-safe resource pool proxy for a specific strategy.
+
+    Keys are mapped into the strategy once, and iteration goes through the
+    reference pool indexes, so the cost is bound to the size of the branch.
     """
 
     def __init__(self, strategy: ResourceKey, resource_pool: ResourcePool):
         self._strategy = strategy
         self._reference_pool = resource_pool
+        self._mapped = {}
 
     def _map(self, resource_key: ResourceKey) -> ResourceKey:
         if isinstance(resource_key, list):
@@ -776,23 +1673,26 @@ class StrategyResourcePool:
         if not isinstance(resource_key, ResourceKey):
             return resource_key
 
-        new_key = {
-            **self._strategy,
-            **resource_key,
-        }
-
-        new_key_strat = self._strategy.strategy + resource_key.strategy
-        if new_key_strat:
-            new_key['strategy'] = new_key_strat
+        mapped = self._mapped.get(resource_key)
+        if mapped is None:
+            strategy = self._strategy
+            mapped = ResourceKey._intern(
+                resource_key._suffix,
+                strategy._strategy + resource_key._strategy,
+                tuple([
+                    value if value is not None else strategy_value
+                    for value, strategy_value in zip(resource_key._values, strategy._values)
+                ]),
+                frozenset(),
+            )
+            self._mapped[resource_key] = mapped
 
-        return ResourceKey(
-            **new_key
-        )
+        return mapped
 
     def __iter__(self) -> Iterator[Tuple[ResourceKey, Resource]]:
+        pool = self._reference_pool._items()
         return iter(
-            (k, v) for k, v in self._reference_pool.items()
-            if k in self._strategy
+            (k, pool[k]) for k in self._reference_pool._select(self._strategy)
         )
 
     def __contains__(self, key: ResourceKey) -> bool:
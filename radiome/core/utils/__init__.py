@@ -1,34 +1,99 @@
 import copy
+import functools
 import hashlib
 from string import Formatter
 
 
-def _nested_repr(obj):
-    if isinstance(obj, dict):
-        return repr([
-            (_nested_repr(k), _nested_repr(v))
-            for k, v in sorted(obj.items(), key=lambda i: i[0])
-        ])
-
-    if isinstance(obj, (list, tuple)):
-        return repr([_nested_repr(v) for v in obj])
-
-    if isinstance(obj, set):
-        return repr([_nested_repr(v) for v in sorted(list(obj))])
-
-    if isinstance(obj, Hashable):
-        return _nested_repr(obj.__longhash__())
-
-    return repr(obj)
+_DIGEST_THRESHOLD = 1024
+
+
+@functools.lru_cache(maxsize=1024)
+def _digest(value):
+    """Digest a large string or bytes value, which are immutable and thus
+    memoized, so the same value is only digested once."""
+    hasher = hashlib.blake2s()
+    if isinstance(value, str):
+        hasher.update(b's')
+        hasher.update(value.encode('UTF-8'))
+    else:
+        hasher.update(b'b')
+        hasher.update(value)
+    return hasher.digest()
+
+
+def _encode(obj, update):
+    """Feed the canonical encoding of an object into a hasher.
+
+    Each value is tagged with its type and, when variable, its length, so
+    distinct structures never produce the same stream. Dicts and sets are
+    sorted, Hashables contribute their long hash, and large strings and
+    bytes contribute their memoized digest. Other objects are encoded by
+    their repr.
+    """
+    if isinstance(obj, str):
+        if len(obj) > _DIGEST_THRESHOLD:
+            update(b'S')
+            update(_digest(obj))
+            return
+        data = obj.encode('UTF-8')
+        update(b's%d:' % len(data))
+        update(data)
+
+    elif isinstance(obj, bytes):
+        if len(obj) > _DIGEST_THRESHOLD:
+            update(b'B')
+            update(_digest(obj))
+            return
+        update(b'b%d:' % len(obj))
+        update(obj)
+
+    elif obj is None:
+        update(b'n')
+
+    elif isinstance(obj, bool):
+        update(b't' if obj else b'f')
+
+    elif isinstance(obj, int):
+        update(b'i%d;' % obj)
+
+    elif isinstance(obj, float):
+        update(b'd%s;' % repr(obj).encode('ascii'))
+
+    elif isinstance(obj, dict):
+        update(b'm%d:' % len(obj))
+        for k, v in sorted(obj.items(), key=lambda i: i[0]):
+            _encode(k, update)
+            _encode(v, update)
+
+    elif isinstance(obj, (list, tuple)):
+        update(b'l%d:' % len(obj))
+        for v in obj:
+            _encode(v, update)
+
+    elif isinstance(obj, (set, frozenset)):
+        update(b'e%d:' % len(obj))
+        for v in sorted(obj):
+            _encode(v, update)
+
+    elif isinstance(obj, Hashable):
+        update(b'h')
+        update(obj.__longhash__().encode('ascii'))
+
+    else:
+        data = repr(obj).encode('UTF-8')
+        update(b'r%d:' % len(data))
+        update(data)
 
 
 def deterministic_hash(obj):
     hasher = hashlib.blake2s(digest_size=8)
-    hasher.update(_nested_repr(obj).encode('UTF-8'))
+    _encode(obj, hasher.update)
     return hasher.hexdigest()
 
 
 class Hashable:
+    __slots__ = ()
+
     _hash = None
 
     def __hashcontent__(self):
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import logging
+import os
+import stat
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+MODES = ('stat', 'sample', 'full')
+
+_SAMPLE = 64 * 1024
+
+
+def _sampled_digest(path: str, size: int) -> str:
+    """Hash the head, the middle and the tail of a file. The tail of gzip
+    files, such as .nii.gz, holds the checksum of their whole content."""
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(b'%d:' % size)
+    with open(path, 'rb') as f:
+        if size <= 3 * _SAMPLE:
+            hasher.update(f.read())
+        else:
+            for offset in (0, (size - _SAMPLE) // 2, size - _SAMPLE):
+                f.seek(offset)
+                hasher.update(f.read(_SAMPLE))
+    return hasher.hexdigest()
+
+
+def _full_digest(path: str, size: int) -> str:
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(b'%d:' % size)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class FingerprintIndex:
+    """  Fingerprints of local files, memoized by path.
+
+    In `stat` mode, the fingerprint of a file is its size, modification
+    time and inode, which changes whenever the file is replaced or
+    rewritten. In `sample` and `full` modes, it is a digest of part or all
+    of the content, which also survives copies and touches. Digests are
+    memoized along with the stat signature of the file they were computed
+    for, and kept in a sidecar index across runs, so files are read again
+    only when they change.
+
+    """
+
+    def __init__(self, path: Optional[str] = None, mode: str = 'stat'):
+        """
+        Create a fingerprint index.
+
+        Args:
+            path: Sidecar file to load the digests from, and to save them to.
+                Digests are only kept in memory if not set.
+            mode: `stat`, `sample` or `full`.
+
+        Raises:
+            ValueError: Invalid mode.
+        """
+        if mode not in MODES:
+            raise ValueError(f'Invalid fingerprint mode "{mode}", options are: {", ".join(MODES)}')
+
+        self._path = path
+        self._mode = mode
+        self._entries = {}
+        self._changed = False
+
+        if path and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning('Ignoring unreadable fingerprint index %s: %s', path, e)
+
+    @property
+    def mode(self) -> str:
+        return self._mode
+
+    def fingerprint(self, path: str) -> Optional[str]:
+        """Fingerprint a local file.
+
+        Args:
+            path: Path of the file.
+
+        Returns:
+            The fingerprint, or None if the path is not a regular file.
+        """
+        try:
+            st = os.stat(path)
+        except (OSError, ValueError):
+            return None
+        if not stat.S_ISREG(st.st_mode):
+            return None
+
+        signature = [st.st_size, st.st_mtime_ns, st.st_ino]
+        if self._mode == 'stat':
+            return '%d:%d:%d' % tuple(signature)
+
+        path = os.path.abspath(path)
+        entry = self._entries.get(path)
+        if entry and entry[0] == signature and entry[1] == self._mode:
+            return entry[2]
+
+        if self._mode == 'sample':
+            digest = _sampled_digest(path, st.st_size)
+        else:
+            digest = _full_digest(path, st.st_size)
+
+        self._entries[path] = [signature, self._mode, digest]
+        self._changed = True
+        return digest
+
+    def save(self):
+        """Write the digests to the sidecar file, if any changed."""
+        if not self._path or not self._changed:
+            return
+
+        temporary = f'{self._path}.{os.getpid()}'
+        with open(temporary, 'w') as f:
+            json.dump(self._entries, f)
+        os.replace(temporary, self._path)
+        self._changed = False
+
+
+_index = FingerprintIndex()
+
+
+def configure(path: Optional[str] = None, mode: str = 'stat') -> FingerprintIndex:
+    """Replace the index used to fingerprint the files of resources.
+
+    Args:
+        path: Sidecar file of the index.
+        mode: `stat`, `sample` or `full`.
+
+    Returns:
+        The new index.
+    """
+    global _index
+    _index = FingerprintIndex(path, mode)
+    return _index
+
+
+def fingerprint(path: str) -> Optional[str]:
+    """Fingerprint a local file with the configured index."""
+    return _index.fingerprint(path)
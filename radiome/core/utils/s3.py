@@ -75,6 +75,20 @@ class S3Resource(Resource, os.PathLike):
                 self._client.get(self.content, self._cached, recursive=True)
             return self._cached
 
+    def __hashcontent__(self):
+        # The ETag changes along with the content of the object, and it is
+        # already known when the object was listed by a walk. Other errors,
+        # such as network or credentials errors, are raised: hashing the
+        # path alone would change the hash between runs
+        try:
+            etag = self._client.info(self.content).get('ETag')
+        except FileNotFoundError:
+            logger.warning(f'Hashing {self.content} without its ETag, it does not exist.')
+            etag = None
+        if etag:
+            return self.content, etag
+        return self.content,
+
     def __fspath__(self):
         return self.__call__()
 
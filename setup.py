@@ -31,13 +31,12 @@ if os.path.exists('requirements_dev.txt'):
 setup(
     author="Cameron Craddock, Anibal Sólon, Pu Zhao",
     author_email='cameron.craddock@gmail.com, anibalsolon@gmail.com, puzhao@utexas.edu',
-    python_requires='>=3, !=3.0.*, !=3.1.*, !=3.2.*, !=3.3.*, !=3.4.*, !=3.5.*',
+    python_requires='>=3, !=3.0.*, !=3.1.*, !=3.2.*, !=3.3.*, !=3.4.*, !=3.5.*, !=3.6.*',
     classifiers=[
         'Development Status :: 2 - Pre-Alpha',
         'Intended Audience :: Developers',
         'Natural Language :: English',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.6',
         'Programming Language :: Python :: 3.7',
         'Programming Language :: Python :: 3.8',
     ],
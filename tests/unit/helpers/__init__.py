@@ -1,5 +1,9 @@
 import os
 
+from radiome.core.execution import DependencySolver
+from radiome.core.jobs import PythonJob
+from radiome.core.resource_pool import ResourceKey as R, ResourcePool
+
 
 class StateProfiler:
 
@@ -42,3 +46,40 @@ class StateProfiler:
 
 def data_path(curr_file, dest):
     return os.path.join(os.path.dirname(os.path.abspath(curr_file)), 'data', dest)
+
+
+calls = []
+failing = []
+
+
+def write(content):
+    calls.append('write')
+    with open('content.txt', 'w') as f:
+        f.write(content)
+    return {
+        'path': os.path.abspath('content.txt'),
+    }
+
+
+def read(path):
+    calls.append('read')
+    if failing:
+        raise RuntimeError('Killed')
+    with open(path) as f:
+        return {
+            'content': f.read(),
+        }
+
+
+def run_content(ctx, **kwargs):
+    """Run a job which writes a file, and a job which reads it, keyed by
+    `label-content_T1w`. Jobs log their calls in `calls`, and the reading
+    job fails while `failing` is not empty."""
+    rp = ResourcePool()
+    writer = PythonJob(function=write, reference='write')
+    writer.content = 'content'
+    reader = PythonJob(function=read, reference='read')
+    reader.path = writer.path
+    rp[R('T1w', label='content')] = reader.content
+
+    return DependencySolver(rp, ctx=ctx, **kwargs).execute()
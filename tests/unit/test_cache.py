@@ -0,0 +1,137 @@
+import os
+import pickle
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import TestCase, mock
+
+from radiome.core.execution.cache import ResultCache, _digest
+from radiome.core.resource_pool import ResourceKey as R
+
+from .helpers import calls, run_content
+
+class TestResultCache(TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        self.working_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.working_dir, ignore_errors=True)
+
+    def test_store(self):
+        cache = ResultCache(self.cache_dir)
+
+        with open(os.path.join(self.working_dir, 'file.nii.gz'), 'w') as f:
+            f.write('content')
+        result = {
+            'path': os.path.join(self.working_dir, 'file.nii.gz'),
+            'paths': [Path(self.working_dir) / 'file.nii.gz'],
+            'other': '/data/file.nii.gz',
+        }
+
+        with self.assertRaises(KeyError):
+            cache.load('job')
+
+        stored = cache.store('job', result, self.working_dir)
+        self.assertIn('job', cache)
+        self.assertTrue(stored['path'].startswith(self.cache_dir))
+        self.assertIsInstance(stored['paths'][0], Path)
+        self.assertEqual(stored['other'], '/data/file.nii.gz')
+
+        loaded = ResultCache(self.cache_dir).load('job')
+        self.assertEqual(loaded, stored)
+        with open(loaded['path']) as f:
+            self.assertEqual(f.read(), 'content')
+
+    def test_store_failure(self):
+        cache = ResultCache(self.cache_dir)
+
+        result = {'path': os.path.join(self.working_dir, 'file.nii.gz')}
+        with mock.patch('shutil.copytree', side_effect=OSError('No space left on device')):
+            self.assertEqual(cache.store('job', result, self.working_dir), result)
+        self.assertNotIn('job', cache)
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def test_integrity(self):
+        cache = ResultCache(self.cache_dir)
+
+        with open(os.path.join(self.working_dir, 'file.nii.gz'), 'w') as f:
+            f.write('content')
+        stored = cache.store('job', os.path.join(self.working_dir, 'file.nii.gz'), self.working_dir)
+
+        # Files are checked against their sizes, and only read to check
+        # their digests if requested
+        with open(stored, 'w') as f:
+            f.write('altered')
+        with mock.patch('radiome.core.execution.cache._digest', wraps=_digest) as digest:
+            cache.load('job')
+        self.assertEqual(digest.call_count, 1)
+
+        with self.assertRaises(KeyError):
+            ResultCache(self.cache_dir, verify_files=True).load('job')
+        self.assertNotIn('job', cache)
+
+        stored = cache.store('job', os.path.join(self.working_dir, 'file.nii.gz'), self.working_dir)
+        with open(stored, 'w') as f:
+            f.write('truncated')
+
+        with self.assertRaises(KeyError):
+            cache.load('job')
+        self.assertNotIn('job', cache)
+
+    def test_eviction(self):
+        old = ResultCache(self.cache_dir)
+        for key in ['a', 'b', 'c']:
+            old.store(key, key * 1024)
+        old.load('a')
+        time.sleep(0.01)
+
+        # Entries used by the current run are kept, as results point to them
+        cache = ResultCache(self.cache_dir, max_size=0)
+        cache.load('c')
+        cache.store('d', 'd' * 1024)
+
+        self.assertNotIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertIn('c', cache)
+        self.assertIn('d', cache)
+
+        cache.clear()
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def test_usage(self):
+        cache = ResultCache(self.cache_dir, max_size=1)
+        for key in ['a', 'b', 'c']:
+            cache.store(key, key * 1024)
+
+        # The cache is only listed again when it goes over its limit
+        with mock.patch('os.listdir', wraps=os.listdir) as listdir:
+            cache.store('d', 'd' * 1024)
+            cache.load('a')
+        listdir.assert_not_called()
+
+        size = sum(os.path.getsize(os.path.join(root, name))
+                   for root, _, names in os.walk(self.cache_dir) for name in names if name != 'manifest.json')
+        self.assertEqual(cache._usage().size, size)
+
+        # Caches unpickled along with jobs share the usage of the process
+        self.assertIs(pickle.loads(pickle.dumps(cache))._usage(), cache._usage())
+
+    def test_solver(self):
+        def run():
+            return run_content(ctx, cache=ResultCache(self.cache_dir))
+
+        ctx = SimpleNamespace(outputs_dir=self.working_dir, working_dir=self.working_dir)
+
+        del calls[:]
+        res_rp = run()
+        self.assertEqual(res_rp[R('T1w', label='content')].content, 'content')
+        self.assertEqual(len(calls), 2)
+
+        # Working directories are wiped, but results are in the cache
+        del res_rp
+        res_rp = run()
+        self.assertEqual(res_rp[R('T1w', label='content')].content, 'content')
+        self.assertEqual(len(calls), 2)
@@ -38,6 +38,13 @@ class CLITestCase(unittest.TestCase):
         self.assertFalse(res.enable_bids_validator)
         self.assertEqual(res.working_dir, self.temp_working_dir)
         self.assertTrue(res.diagnostics)
+        self.assertEqual(res.executor, 'dask')
+        self.assertEqual(cli.parse_args(self.args + ['--executor', 'local']).executor, 'local')
+        self.assertIsNone(res.cache_dir)
+        self.assertFalse(res.clear_cache)
+        self.assertFalse(res.verify_cache)
+        self.assertFalse(res.resume)
+        self.assertTrue(cli.parse_args(self.args + ['--resume']).resume)
 
     def test_build_context(self):
         # mutation test
@@ -1,9 +1,18 @@
-from unittest import TestCase
+import os
+import pickle
+import subprocess
+import sys
+from types import SimpleNamespace
+from unittest import TestCase, mock
+
+import numpy
+from distributed import Client, LocalCluster
+from distributed.protocol import deserialize, serialize
 from radiome.core.resource_pool import ResourceKey as R, Resource, InvalidResource, ResourcePool
 from radiome.core.execution import DependencySolver
-from radiome.core.execution.executor import Execution, DaskExecution, executors
+from radiome.core.execution.executor import Execution, DaskExecution, LocalExecution, cluster_options, executors
 from radiome.core.jobs import PythonJob
-from radiome.core.utils import Hashable
+from radiome.core.utils import Hashable, deterministic_hash
 
 import logging
 
@@ -46,6 +55,39 @@ def timestamp(delay):
     }
 
 
+class ProcessResource(Resource):
+    """Resource which fetches its content, the process and thread it runs on."""
+
+    def __call__(self, **state):
+        import threading
+        return f'{os.getpid()}:{threading.current_thread().name}'
+
+
+def executor_pool():
+    """Pool of independent jobs, a failing job and a job which reads a
+    resource which fetches its content, to run with parallel executors."""
+    rp = ResourcePool()
+
+    file_basename = PythonJob(function=basename, reference='basename')
+    file_basename.path = '/path/to/file.nii.gz'
+    rp[R('T1w', label='base')] = file_basename.path
+
+    for i in range(4):
+        file_reversed = PythonJob(function=reversed_string, reference=f'reversed_string_{i}')
+        file_reversed.path = file_basename.dirname
+        rp[R('T1w', label=f'rev{i}')] = file_reversed.reversed
+
+    erred = PythonJob(function=reversed_string, reference='erred')
+    erred.path = file_basename.missing
+    rp[R('T1w', label='err')] = erred.reversed
+
+    fetched = PythonJob(function=basename, reference='fetched')
+    fetched.path = ProcessResource('remote')
+    rp[R('T1w', label='fetched')] = fetched.path
+
+    return rp
+
+
 A00008326_file = 's3://fcp-indi/data/Projects/RocklandSample/RawDataBIDSLatest/sub-A00008326/ses-BAS1/anat/sub-A00008326_ses-BAS1_T1w.nii.gz'
 A00008326_dir = 's3://fcp-indi/data/Projects/RocklandSample/RawDataBIDSLatest/sub-A00008326/ses-BAS1/anat'
 A00008326_base = 'sub-A00008326_ses-BAS1_T1w.nii.gz'
@@ -155,7 +197,8 @@ class TestExecution(TestCase):
         delayed2.delay = Resource(wait)
         rp[R('T1w', label='time2')] = delayed2.time
 
-        res_rp = DependencySolver(rp).execute(executor=DaskExecution())
+        ctx = SimpleNamespace(n_cpus=2, memory=8 * 1024, working_dir=os.path.abspath('.'), diagnostics=False)
+        res_rp = DependencySolver(rp).execute(executor=DaskExecution(ctx=ctx))
 
         self.assertIn(R('label-time1_T1w'), res_rp)
         self.assertIn(R('label-time2_T1w'), res_rp)
@@ -229,6 +272,25 @@ class TestExecution(TestCase):
 
         self.assertEqual(hash(Content(a)), hash(Content(b)))
 
+        self.assertNotEqual(deterministic_hash('1'), deterministic_hash(1))
+        self.assertNotEqual(deterministic_hash(['a', 'b']), deterministic_hash(['ab']))
+        self.assertNotEqual(deterministic_hash({'a': None}), deterministic_hash({'a': 'None'}))
+        self.assertNotEqual(deterministic_hash('a' * 4096), deterministic_hash(b'a' * 4096))
+        self.assertEqual(deterministic_hash(frozenset('abcdef')), deterministic_hash(set('fedcba')))
+
+        content = ({'a': frozenset('abc'), 'b': 1.5}, 'x' * 4096, [True, None, b'bytes'])
+        script = (
+            'from radiome.core.utils import deterministic_hash;'
+            f'print(deterministic_hash({content!r}))'
+        )
+        for seed in ['1', '2']:
+            process = subprocess.run(
+                [sys.executable, '-c', script],
+                env={**os.environ, 'PYTHONHASHSEED': seed},
+                stdout=subprocess.PIPE, check=True, universal_newlines=True,
+            )
+            self.assertEqual(process.stdout.strip(), deterministic_hash(content))
+
     def test_cycle(self):
 
         rp = ResourcePool()
@@ -254,3 +316,137 @@ class TestExecution(TestCase):
 
         with self.assertRaises(ValueError):
             G = DependencySolver(rp).graph
+
+    def test_graph_cache(self):
+
+        rp = ResourcePool()
+
+        file_basename = PythonJob(function=basename, reference='basename')
+        file_basename.path = '/path/to/file.nii.gz'
+        rp[R('T1w')] = file_basename.path
+
+        solver = DependencySolver(rp)
+        G = solver.graph
+        self.assertIs(solver.graph, G)
+        nodes = len(G)
+
+        file_reversed = PythonJob(function=reversed_string, reference='reversed_string')
+        file_reversed.path = file_basename.path
+        rp[R('T1w', label='reversed')] = file_reversed.reversed
+
+        self.assertIs(solver.graph, G)
+
+        solver.invalidate(rp)
+        self.assertIsNot(solver.graph, G)
+        self.assertGreater(len(solver.graph), nodes)
+
+        res_rp = solver.execute(executor=Execution())
+        self.assertEqual(res_rp[R('T1w', label='reversed')].content, 'zg.iin.elif')
+
+    def test_release(self):
+
+        rp = ResourcePool()
+
+        file_basename = PythonJob(function=basename, reference='basename')
+        file_basename.path = '/path/to/file.nii.gz'
+        file_reversed = PythonJob(function=reversed_string, reference='reversed_string')
+        file_reversed.path = file_basename.path
+        rp[R('T1w')] = file_reversed.reversed
+
+        solver = DependencySolver(rp)
+        plan = solver.plan
+        results = Execution().execute(graph=plan)
+
+        self.assertEqual(set(results), {hash(plan.job(node)) for node in plan.references})
+        self.assertEqual(solver._gather(results)[R('T1w')].content, 'zg.iin.elif')
+
+    def test_local(self):
+
+        rp = executor_pool()
+
+        res_rp = DependencySolver(rp).execute(executor=LocalExecution(n_cpus=2, memory=4))
+
+        # Resources which fetch their content run in the pool
+        self.assertNotEqual(res_rp[R('T1w', label='fetched')].content.split(':')[0], str(os.getpid()))
+
+        self.assertEqual(res_rp[R('T1w', label='base')].content, 'file.nii.gz')
+        for i in range(4):
+            self.assertEqual(res_rp[R('T1w', label=f'rev{i}')].content, 'ot/htap/')
+        self.assertIsInstance(res_rp[R('T1w', label='err')], InvalidResource)
+
+    def test_cluster_options(self):
+
+        ctx = SimpleNamespace(n_cpus=8, memory=16 * 1024, working_dir=os.path.abspath('.'))
+        options = cluster_options(ctx)
+
+        self.assertEqual(options['n_workers'], 4)
+        self.assertEqual(options['threads_per_worker'], 2)
+        self.assertEqual(options['memory_limit'], 4 * 1024 ** 3)
+        self.assertEqual(options['resources']['cpu'], 2)
+        self.assertEqual(options['resources']['memory'], 4)
+        self.assertGreater(options['resources']['storage'], 0)
+
+        options = cluster_options(SimpleNamespace(n_cpus=1, memory=1024, working_dir=ctx.working_dir))
+        self.assertEqual(options['n_workers'], 1)
+        self.assertEqual(options['threads_per_worker'], 1)
+        self.assertEqual(options['resources']['memory'], 1)
+
+        # Odd cpus are not left out
+        options = cluster_options(SimpleNamespace(n_cpus=3, memory=3 * 1024, working_dir=ctx.working_dir))
+        self.assertEqual(options['n_workers'], 3)
+        self.assertEqual(options['threads_per_worker'], 1)
+        self.assertEqual(options['resources']['cpu'], 1)
+        self.assertEqual(options['memory_limit'], 1024 ** 3)
+
+    def test_serialization(self):
+
+        job = PythonJob(function=reversed_string, reference='reversed_string')
+        path = numpy.arange(1024, dtype=numpy.float64)
+        job.path = path
+
+        header, frames = serialize(job, serializers=['radiome', 'cloudpickle'])
+        self.assertEqual(header['serializer'], 'radiome')
+
+        # Buffers travel out of band, in their own frames, where pickle
+        # protocol 5 is available
+        if pickle.HIGHEST_PROTOCOL >= 5:
+            self.assertEqual(len(frames), 2)
+            self.assertEqual(bytes(frames[1]), path.tobytes())
+        else:
+            self.assertEqual(len(frames), 1)
+
+        loaded = deserialize(header, [bytes(frame) for frame in frames], deserializers=['radiome', 'cloudpickle'])
+        self.assertEqual(hash(loaded), hash(job))
+        loaded_path = loaded._inputs['path'].content
+        numpy.testing.assert_array_equal(loaded_path, path)
+        self.assertTrue(loaded_path.flags.writeable)
+
+        # Only radiome objects use the radiome family
+        header, frames = serialize({'path': 'file.nii.gz'}, serializers=['radiome', 'cloudpickle'])
+        self.assertEqual(header['serializer'], 'cloudpickle')
+        self.assertEqual(deserialize(header, frames, deserializers=['radiome', 'cloudpickle']), {'path': 'file.nii.gz'})
+
+    def test_dask_jobs(self):
+
+        rp = executor_pool()
+
+        options = cluster_options(SimpleNamespace(n_cpus=2, memory=2048, working_dir=os.path.abspath('.')))
+        with LocalCluster(processes=False, dashboard_address=None, **options) as cluster, \
+                Client(cluster) as client, \
+                mock.patch.object(client, 'submit') as submit, \
+                mock.patch.object(client, 'get', wraps=client.get) as get, \
+                mock.patch.object(PythonJob, '__str__', lambda job: 'PythonJob(collision)'):
+            # Jobs with the same representation do not share their task
+            res_rp = DependencySolver(rp).execute(executor=DaskExecution(client=client))
+
+        # The whole plan is submitted in a single graph
+        submit.assert_not_called()
+        self.assertEqual(get.call_count, 1)
+
+        # Resources which fetch their content run on the workers
+        self.assertNotEqual(res_rp[R('T1w', label='fetched')].content.split(':')[1], 'MainThread')
+
+        self.assertEqual(res_rp[R('T1w', label='base')].content, 'file.nii.gz')
+        for i in range(4):
+            self.assertEqual(res_rp[R('T1w', label=f'rev{i}')].content, 'ot/htap/')
+        self.assertIsInstance(res_rp[R('T1w', label='err')], InvalidResource)
@@ -0,0 +1,61 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase, mock
+
+from radiome.core.utils import fingerprint
+from radiome.core.utils.fingerprint import FingerprintIndex
+
+
+class TestFingerprintIndex(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.path = os.path.join(self.directory, 'sub-001_T1w.nii.gz')
+        with open(self.path, 'wb') as f:
+            f.write(os.urandom(1024 * 1024))
+
+    def test_modes(self):
+        with self.assertRaises(ValueError):
+            FingerprintIndex(mode='md5')
+
+        self.assertIsNone(FingerprintIndex().fingerprint(self.directory))
+        self.assertIsNone(FingerprintIndex().fingerprint(os.path.join(self.directory, 'missing')))
+
+        stat = FingerprintIndex().fingerprint(self.path)
+        sample = FingerprintIndex(mode='sample').fingerprint(self.path)
+        full = FingerprintIndex(mode='full').fingerprint(self.path)
+        self.assertEqual(len({stat, sample, full}), 3)
+
+        # Digests do not depend on where the content is
+        copy = os.path.join(self.directory, 'copy.nii.gz')
+        with open(self.path, 'rb') as src, open(copy, 'wb') as dst:
+            dst.write(src.read())
+        self.assertNotEqual(FingerprintIndex().fingerprint(copy), stat)
+        self.assertEqual(FingerprintIndex(mode='sample').fingerprint(copy), sample)
+        self.assertEqual(FingerprintIndex(mode='full').fingerprint(copy), full)
+
+    def test_sidecar(self):
+        sidecar = os.path.join(self.directory, 'fingerprints.json')
+
+        index = FingerprintIndex(sidecar, mode='full')
+        digest = index.fingerprint(self.path)
+        index.save()
+
+        # Unchanged files are not read again
+        with mock.patch.object(fingerprint, '_full_digest') as full_digest:
+            self.assertEqual(FingerprintIndex(sidecar, mode='full').fingerprint(self.path), digest)
+            full_digest.assert_not_called()
+
+        with open(self.path, 'ab') as f:
+            f.write(b'altered')
+        index = FingerprintIndex(sidecar, mode='full')
+        self.assertNotEqual(index.fingerprint(self.path), digest)
+
+    def test_configure(self):
+        try:
+            index = fingerprint.configure(mode='sample')
+            self.assertEqual(fingerprint.fingerprint(self.path), index.fingerprint(self.path))
+        finally:
+            fingerprint.configure()
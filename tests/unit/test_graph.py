@@ -0,0 +1,61 @@
+from unittest import TestCase
+
+import networkx as nx
+
+from radiome.core.execution.graph import JobGraph
+
+
+class TestJobGraph(TestCase):
+
+    def test_order(self):
+        #  0 -> 1 -> 3
+        #  2 -> 3
+        #  4 -> 5
+        G = JobGraph(
+            list('abcdef'),
+            [(1, 3, 'x'), (0, 1, 'y'), (2, 3, 'z'), (4, 5, 'w')],
+        )
+
+        self.assertEqual(len(G), 6)
+        position = {node: i for i, node in enumerate(G.order)}
+        self.assertEqual(sorted(position), list(range(6)))
+        for src, dst in [(0, 1), (1, 3), (2, 3), (4, 5)]:
+            self.assertLess(position[src], position[dst])
+
+        self.assertEqual(sorted(G.predecessors(3)), [(1, 'x'), (2, 'z')])
+        self.assertEqual(list(G.successors(0)), [1])
+        self.assertEqual(G.job(3), 'd')
+
+        components = sorted(G.components(), key=len)
+        self.assertEqual([sorted(c) for c in components], [[4, 5], [0, 1, 2, 3]])
+        for component in components:
+            self.assertEqual(component, [n for n in G.order if n in component])
+
+    def test_component(self):
+        G = JobGraph(list('abcd'), [(0, 1, 'x'), (2, 3, 'x')])
+
+        self.assertEqual(G.component(0), G.component(1))
+        self.assertNotEqual(G.component(1), G.component(2))
+        self.assertEqual(G.components()[G.component(3)], [2, 3])
+
+    def test_cycle(self):
+        with self.assertRaises(ValueError):
+            JobGraph(list('abc'), [(0, 1, 'x'), (1, 2, 'x'), (2, 0, 'x')])
+
+        with self.assertRaises(ValueError):
+            JobGraph(list('a'), [(0, 0, 'x')])
+
+    def test_networkx(self):
+        G = JobGraph(
+            list('abc'),
+            [(0, 2, 'x'), (1, 2, 'y')],
+            ids=[10, 11, 12],
+            references={2: {'key'}},
+        ).to_networkx(name='graph')
+
+        self.assertIsInstance(G, nx.DiGraph)
+        self.assertEqual(G.graph['name'], 'graph')
+        self.assertEqual(G.nodes[12]['job'], 'c')
+        self.assertEqual(G.nodes[12]['references'], {'key'})
+        self.assertEqual(G.edges[(11, 12)]['field'], 'y')
+        self.assertTrue(nx.is_directed_acyclic_graph(G))
@@ -1,10 +1,13 @@
 import unittest
+from unittest import mock
 
+import cloudpickle
 import networkx
 from nipype.interfaces import base as nib
 
 from radiome.core.execution import DependencySolver
-from radiome.core.jobs import NipypeJob
+from radiome.core.jobs import NipypeJob, PythonJob
+from radiome.core.jobs import job as job_module
 from radiome.core.resource_pool import ResourceKey, ResourcePool
 
 
@@ -44,3 +47,98 @@ class TestNipypeJob(unittest.TestCase):
         self.assertIn(id(mod1), g.nodes)
         self.assertIn(id(mod2), g.nodes)
         self.assertTrue(networkx.algorithms.bidirectional_dijkstra(g, id(mod1), id(mod2)))
+
+
+def scale(path):
+    return {'path': path * factor}
+
+
+factor = 2
+
+
+class TestPythonJob(unittest.TestCase):
+
+    def test_function_fingerprint(self):
+        global factor
+
+        def scaled(path):
+            return {'path': path * factor}
+
+        def offset(value):
+            def add(path):
+                return {'path': path + value}
+            return add
+
+        with mock.patch.object(job_module.cloudpickle, 'dumps', wraps=cloudpickle.dumps) as dumps:
+            hashes = set()
+            for i in range(100):
+                job = PythonJob(function=scale, reference='scale')
+                job.path = i
+                hashes.add(job.__longhash__())
+            self.assertEqual(len(hashes), 100)
+            self.assertEqual(dumps.call_count, 1)
+
+            reference = PythonJob(function=scaled).__longhash__()
+            factor = 3
+            try:
+                self.assertNotEqual(PythonJob(function=scaled).__longhash__(), reference)
+            finally:
+                factor = 2
+            self.assertEqual(PythonJob(function=scaled).__longhash__(), reference)
+
+            self.assertNotEqual(
+                PythonJob(function=offset(1)).__longhash__(),
+                PythonJob(function=offset(2)).__longhash__(),
+            )
+
+    def test_hash_propagation(self):
+
+        def chain(value):
+            first = PythonJob(function=scale, reference='first')
+            first.path = value
+            second = PythonJob(function=scale, reference='second')
+            second.path = first.path
+            third = PythonJob(function=scale, reference='third')
+            third.path = second.path
+            return first, second, third
+
+        first, second, third = chain(1)
+        other = PythonJob(function=scale, reference='other')
+        other.path = first.path
+
+        hashes = [job.__longhash__() for job in (first, second, third, other)]
+
+        second.path = 2
+        self.assertIsNotNone(first._hash)
+        self.assertIsNotNone(other._hash)
+        self.assertIsNone(second._hash)
+        self.assertIsNone(third._hash)
+
+        second.path = first.path
+        self.assertEqual(third.__longhash__(), hashes[2])
+
+        first.path = 2
+        self.assertIsNone(other._hash)
+        self.assertIsNone(third._hash)
+        self.assertNotEqual(third.__longhash__(), hashes[2])
+        self.assertEqual(third.__longhash__(), chain(2)[2].__longhash__())
+
+        # An input shared by several fields stays tracked until all of them
+        # are replaced
+        def shared(value):
+            first = PythonJob(function=scale, reference='first')
+            first.path = value
+            computed = first.path
+            second = PythonJob(function=scale, reference='second')
+            second.a = computed
+            second.b = computed
+            return first, second
+
+        first, second = shared(1)
+        second.a = 5
+        second.__longhash__()
+        first.path = 2
+
+        expected = shared(2)[1]
+        expected.a = 5
+        self.assertEqual(second.__longhash__(), expected.__longhash__())
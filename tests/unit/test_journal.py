@@ -0,0 +1,82 @@
+import os
+import shutil
+import tempfile
+from types import SimpleNamespace
+from unittest import TestCase
+
+from radiome.core.execution.cache import ResultCache
+from radiome.core.execution.journal import RunJournal
+from radiome.core.resource_pool import InvalidResource, ResourceKey as R
+
+from .helpers import calls, failing, run_content
+
+class TestRunJournal(TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.working_dir, ignore_errors=True)
+        self.path = os.path.join(self.working_dir, 'journal.jsonl')
+
+    def test_records(self):
+        journal = RunJournal(self.path)
+        self.assertEqual(journal.completed(), {})
+
+        journal.record('a', 'done', {'value': 1})
+        journal.record('b', 'done', {'value': 2})
+        journal.record('b', 'error', error=RuntimeError('Killed'))
+        journal.record('c', 'done', {'path': os.path.join(self.working_dir, 'missing.nii.gz')})
+        journal.record('e', 'done', {'path': os.path.join(tempfile.gettempdir(), 'missing', 'file.nii.gz')})
+
+        # A run killed while writing leaves a truncated record
+        with open(self.path, 'a') as f:
+            f.write('{"job": "d", "sta')
+
+        self.assertEqual(RunJournal(self.path).completed(), {'a': {'value': 1}})
+
+        journal.clear()
+        self.assertEqual(journal.completed(), {})
+
+    def test_resume(self):
+        def run():
+            return run_content(ctx, journal=RunJournal(self.path))
+
+        ctx = SimpleNamespace(outputs_dir=self.working_dir, working_dir=self.working_dir)
+
+        del calls[:]
+        failing.append(True)
+        res_rp = run()
+        self.assertIsInstance(res_rp[R('T1w', label='content')], InvalidResource)
+        self.assertEqual(calls, ['write', 'read'])
+
+        # Finished jobs are not computed again, and their outputs are kept
+        del calls[:], failing[:]
+        res_rp = run()
+        self.assertEqual(res_rp[R('T1w', label='content')].content, 'content')
+        self.assertEqual(calls, ['read'])
+
+    def test_resume_cache(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        ctx = SimpleNamespace(outputs_dir=self.working_dir, working_dir=self.working_dir)
+
+        del calls[:]
+        failing.append(True)
+        run_content(ctx, cache=ResultCache(cache_dir), journal=RunJournal(self.path))
+        del failing[:]
+        entries = os.listdir(cache_dir)
+        self.assertEqual(len(entries), 1)
+
+        # Outputs restored from the cache are not evicted by the resumed run
+        del calls[:]
+        res_rp = run_content(ctx, cache=ResultCache(cache_dir, max_size=0), journal=RunJournal(self.path))
+        self.assertEqual(res_rp[R('T1w', label='content')].content, 'content')
+        self.assertEqual(calls, ['read'])
+        self.assertEqual(len(os.listdir(cache_dir)), 2)
+
+        # Outputs evicted from the cache are computed again, while outputs
+        # without files are still restored
+        ResultCache(cache_dir).clear()
+        del calls[:]
+        res_rp = run_content(ctx, journal=RunJournal(self.path))
+        self.assertEqual(res_rp[R('T1w', label='content')].content, 'content')
+        self.assertEqual(calls, ['write'])
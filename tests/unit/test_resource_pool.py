@@ -1,3 +1,5 @@
+import os
+import tempfile
 from itertools import product
 from unittest import TestCase
 
@@ -238,3 +240,426 @@ class TestResourcePool(TestCase):
 
         with self.assertRaises(ValueError):
             R(key_string_invalid_form6)
+
+    def test_resource_key_interning(self):
+
+        key = R('sub-001_ses-001_desc-skullstrip-afni_mask')
+
+        self.assertIs(key, R('sub-001_ses-001_desc-skullstrip-afni_mask'))
+        self.assertIs(key, R(key))
+        self.assertIs(key, R('mask', sub='001', ses='001', strategy='skullstrip-afni'))
+        self.assertIs(key.strategy, R('desc-skullstrip-afni_T1w').strategy)
+
+        self.assertIsNot(key, R(key, tags=['qc']))
+        self.assertIs(R(key, tags=['qc']), R(key, tags={'qc'}))
+        self.assertEqual(R(key, tags=['qc']).tags, {'qc'})
+        self.assertEqual(key.tags, set())
+
+        self.assertEqual(R(key, ses='002')['ses'], '002')
+        self.assertEqual(key['ses'], '001')
+
+    def test_resource_key_parse(self):
+
+        names = [
+            'sub-701_ses-001_desc-skullstrip-afni_mask',
+            'sub-701_ses-001_desc-skullstrip-afni_mask',
+            'ses-002_sub-701_desc-brain#skullstrip-afni+nuis-gsr_T1w',
+            'sub-701_desc-brain_T1w',
+            'sub-701_desc-brain_T1w',
+            'sub-701_strategy-skullstrip-bet_T1w',
+            'sub-701_ses-*_T1w',
+            'sub-701_run-001_run-002_bold',
+        ]
+        keys = R._parse(names)
+
+        for name, key in zip(names, keys):
+            self.assertIs(key, R(name))
+        self.assertEqual(str(keys[2]), 'sub-701_ses-002_desc-brain#skullstrip-afni+nuis-gsr_T1w')
+        self.assertEqual(keys[3]['desc'], 'brain')
+        self.assertEqual(keys[7]['run'], '002')
+
+        for name in ['atlas_desc-afni_mask', 'mask_atlas', 'something', '_desc-afni_mask', '',
+                     'sub-701_ses-_T1w', 'sub-701_desc-#skullstrip-afni_T1w']:
+            with self.assertRaises(ValueError):
+                R._parse([name])
+
+        with self.assertRaises(KeyError):
+            R._parse(['sub-701_something-emmm_T1w'])
+
+    def test_resource_key_compact(self):
+
+        key = R('sub-001_ses-001_desc-skullstrip-afni+nuis-gsr_mask', tags=['qc'])
+
+        self.assertFalse(hasattr(key, '__dict__'))
+        self.assertIs(key.entities, key.entities)
+        self.assertIs(key.tags, key.tags)
+        self.assertIs(key.strategy.forks, key.strategy.forks)
+
+        self.assertEqual(dict(key.entities), {'sub': '001', 'ses': '001'})
+        self.assertEqual(dict(key.strategy.forks), {'skullstrip': 'afni', 'nuis': 'gsr'})
+        self.assertEqual(key.keys(), ['sub', 'ses', 'suffix', 'strategy'])
+        self.assertEqual(str(key), 'sub-001_ses-001_desc-skullstrip-afni+nuis-gsr_mask')
+
+        with self.assertRaises(TypeError):
+            key.entities['sub'] = '002'
+
+        import pickle
+        self.assertIs(pickle.loads(pickle.dumps(key)), key)
+
+    def test_resource_key_matcher(self):
+
+        keys = [
+            R('sub-001_T1w'),
+            R('sub-001_ses-001_T1w'),
+            R('sub-002_ses-001_desc-skullstrip-afni_mask'),
+            R('sub-002_ses-001_desc-skullstrip-bet_mask', tags=['qc']),
+        ]
+
+        filters = {
+            R('sub-*_ses-^_T1w'): [True, False, False, False],
+            R('sub-001_T1w'): [True, True, False, False],
+            R('ses-001'): [True, True, True, True],
+            R('desc-skullstrip-bet_mask'): [False, False, False, True],
+            R('mask', tags=['qc']): [False, False, False, True],
+        }
+
+        for key_filter, expected in filters.items():
+            matcher = key_filter.matcher
+            self.assertIs(matcher, key_filter.matcher)
+
+            self.assertEqual([key in key_filter for key in keys], expected)
+            self.assertEqual([matcher(key) for key in keys], expected)
+            self.assertEqual(matcher.mask(keys), expected)
+            self.assertEqual(
+                matcher.filter(keys),
+                [key for key, match in zip(keys, expected) if match]
+            )
+
+    def test_resource_pool_index(self):
+
+        rp = ResourcePool()
+
+        for sub, ses in product(range(3), range(2)):
+            prefix = 'sub-%03d_ses-%03d_' % (sub, ses)
+            rp[prefix + 'T1w'] = Resource(prefix + 'T1w')
+            rp[prefix + 'desc-skullstrip-afni_mask'] = Resource(prefix + 'afni')
+            rp[R(prefix + 'desc-skullstrip-bet_mask', tags=['qc'])] = Resource(prefix + 'bet')
+        rp['space-MNI_mask'] = Resource('template')
+
+        filters = [
+            R('sub-001_T1w'),
+            R('sub-001_ses-*_mask'),
+            R('ses-^_mask'),
+            R('desc-skullstrip-bet_mask'),
+            R('mask', tags=['qc']),
+            R('sub-002_ses-001_desc-skullstrip-afni_mask'),
+        ]
+
+        for key_filter in filters:
+            expected = [key for key, _ in rp if key in key_filter]
+            self.assertEqual(rp._select(key_filter), expected)
+            if key_filter.isfilter():
+                self.assertEqual(list(rp[key_filter].raw), expected)
+
+        self.assertEqual(len(rp), 19)
+        self.assertEqual(len(rp['qc']), 6)
+        self.assertEqual(len(rp['mask']), 13)
+        self.assertNotIn(R('sub-003_T1w'), rp)
+        self.assertIn(R('sub-003_mask'), rp)
+
+        with self.assertRaises(KeyError):
+            rp['sub-000_ses-000_T1w'] = Resource('duplicated')
+        self.assertEqual(rp[R('sub-000_ses-000_T1w')], Resource('sub-000_ses-000_T1w'))
+
+    def test_resource_pool_extraction_join(self):
+
+        rp = ResourcePool()
+
+        for sub in range(3):
+            rp['sub-%03d_space-orig_T1w' % sub] = Resource(sub)
+            for ses in range(2):
+                prefix = 'sub-%03d_ses-%03d_' % (sub, ses)
+                for skullstrip in ['afni', 'bet']:
+                    rp[prefix + 'space-orig_desc-skullstrip-%s_mask' % skullstrip] = Resource(prefix)
+                if sub != 1:
+                    for nuis in ['gsr', 'nogsr']:
+                        rp[prefix + 'space-orig_desc-skullstrip-afni+nuis-%s_bold' % nuis] = Resource(prefix)
+        rp['space-MNI_desc-nuis-gsr_mask'] = Resource('template')
+
+        selections = [
+            ['space-orig_T1w'],
+            ['space-orig_T1w', 'space-orig_mask'],
+            ['space-orig_T1w', 'space-orig_mask', 'space-orig_bold'],
+            ['space-orig_mask', 'space-MNI_mask'],
+            ['sub-*_space-orig_mask', 'space-orig_bold'],
+            ['sub-001_space-orig_bold'],
+        ]
+
+        for selection in selections:
+            extraction = [str(k) for k, _ in rp.extract(*selection)]
+            reference = [str(k) for k, _ in rp._extract_product(*selection)]
+            self.assertEqual(sorted(extraction), sorted(reference))
+            self.assertEqual(len(extraction), len(set(extraction)))
+            self.assertEqual(len(rp.extract(*selection)), len(reference))
+
+        self.assertEqual(len(list(rp.extract('space-orig_T1w', 'space-orig_bold'))), 2 * 2 * 2)
+        self.assertEqual(list(rp.extract('sub-001_space-orig_bold')), [])
+
+    def test_resource_pool_extraction_chunks(self):
+
+        rp = ResourcePool()
+
+        for sub in range(5):
+            rp['sub-%03d_T1w' % sub] = Resource(sub)
+            rp['sub-%03d_ses-001_T1w' % sub] = Resource(sub)
+            rp['sub-%03d_desc-skullstrip-afni_mask' % sub] = Resource(sub)
+            rp['sub-%03d_desc-skullstrip-bet_mask' % sub] = Resource(sub)
+
+        extraction = rp[['T1w', 'mask']]
+        self.assertEqual(len(extraction), 5 * 2)
+
+        chunks = list(extraction.chunks(3))
+        self.assertEqual([len(chunk) for chunk in chunks], [3, 3, 3, 1])
+        self.assertEqual(
+            [str(k) for chunk in chunks for k, _ in chunk],
+            [str(k) for k, _ in extraction]
+        )
+
+        # keys with and without session overlap, and must not be repeated
+        extraction = rp.extract('T1w')
+        self.assertEqual(len(extraction), 5)
+        self.assertEqual(len(extraction), len(list(extraction)))
+
+        with self.assertRaises(ValueError):
+            next(extraction.chunks(0))
+
+    def test_resource_pool_bulk(self):
+
+        items = []
+        for sub, ses in product(range(4), range(2)):
+            prefix = 'sub-%03d_ses-%03d_' % (sub, ses)
+            items += [
+                (prefix + 'T1w', Resource(prefix + 'T1w')),
+                (R(prefix + 'desc-skullstrip-afni_mask'), prefix + 'mask'),
+                '/data/sub-%03d/ses-%03d/func/%stask-rest_bold.nii.gz' % (sub, ses, prefix),
+            ]
+
+        rp = ResourcePool.from_items(items)
+
+        reference = ResourcePool()
+        for item in items:
+            if isinstance(item, tuple):
+                reference[item[0]] = item[1]
+            else:
+                reference[os.path.basename(item).split('.')[0]] = Resource(item)
+
+        self.assertEqual(list(rp.raw.items()), list(reference.raw.items()))
+        self.assertEqual(rp[R('sub-002_ses-001_task-rest_bold')].content,
+                         '/data/sub-002/ses-001/func/sub-002_ses-001_task-rest_bold.nii.gz')
+        self.assertEqual(
+            sorted(str(k) for k, _ in rp.extract('T1w', 'mask', 'bold')),
+            sorted(str(k) for k, _ in reference.extract('T1w', 'mask', 'bold')),
+        )
+
+        with self.assertRaises(KeyError):
+            rp.update([('sub-100_T1w', 'new'), ('sub-100_T1w', 'duplicated')])
+
+        with self.assertRaises(KeyError):
+            rp.update([('sub-100_T1w', 'new'), ('sub-000_ses-000_T1w', 'existing')])
+
+        with self.assertRaises(KeyError):
+            rp.update([('sub-*_T1w', 'filter')])
+
+        self.assertNotIn(R('sub-100_T1w'), rp)
+
+        rp.update([('sub-100_T1w', 'new')])
+        self.assertEqual(rp[R('sub-100_T1w')].content, 'new')
+
+    def test_resource_key_order(self):
+
+        keys = [
+            R('sub-001_T1w'),
+            R('sub-001_ses-001_T1w'),
+            R('sub-001_label-initial_T1w'),
+            R('sub-002_T1w'),
+            R('sub-001_desc-skullstrip-afni_T1w'),
+            R('sub-001_desc-skullstrip-afni+nuis-gsr_T1w'),
+            R('sub-001_desc-nuis-gsr_T1w'),
+            R('sub-001_mask'),
+        ]
+
+        self.assertIs(keys[0].sort_key, keys[0].sort_key)
+        self.assertEqual(sorted(keys), sorted(keys, key=lambda k: k.sort_key))
+        self.assertEqual(max(keys), R('sub-001_mask'))
+        self.assertLess(R('sub-001_label-initial_T1w'), R('sub-001_ses-001_T1w'))
+        self.assertLess(R('sub-001_desc-skullstrip-afni_T1w'), R('sub-001_desc-skullstrip-afni+nuis-gsr_T1w'))
+
+        rp = ResourcePool()
+        rp['sub-001_T1w'] = Resource('raw')
+        rp['sub-001_desc-skullstrip-afni_T1w'] = Resource('afni')
+        rp['sub-001_desc-skullstrip-afni+nuis-gsr_T1w'] = Resource('gsr')
+
+        self.assertEqual(rp[R('T1w', sub='001')], Resource('raw'))
+        self.assertEqual(rp[R('T1w', sub='001', strategy='nuis-gsr')], Resource('gsr'))
+        self.assertEqual(rp[R('T1w', sub='001', strategy='skullstrip-afni')], Resource('afni'))
+
+        with self.assertRaises(KeyError):
+            rp[R('sub-002_T1w')]
+
+    def test_strategy_resource_pool(self):
+
+        rp = ResourcePool()
+        for sub in ['001', '002', '003']:
+            rp[R(f'sub-{sub}_T1w')] = Resource(f'{sub}')
+            rp[R(f'sub-{sub}_desc-skullstrip-afni_mask')] = Resource(f'afni-{sub}')
+            rp[R(f'sub-{sub}_desc-skullstrip-bet_mask')] = Resource(f'bet-{sub}')
+        rp[R('label-atlas_mask')] = Resource('atlas')
+
+        groups = dict(rp.extract('T1w', 'mask'))
+        self.assertEqual(len(groups), 3 * 2)
+
+        for group_key, group in groups.items():
+            matcher = group_key.matcher
+            self.assertEqual(
+                sorted(str(k) for k, _ in group),
+                sorted(str(k) for k, _ in rp if matcher(k)),
+            )
+
+        group = groups[R('sub-002_desc-skullstrip-bet_*')]
+        self.assertIn(R('label-atlas_mask'), dict(group))
+
+        mapped = group._map(R('T1w'))
+        self.assertIs(group._map(R('T1w')), mapped)
+        self.assertEqual(mapped, R('sub-002_desc-skullstrip-bet_T1w'))
+        self.assertEqual(group[R('T1w')], Resource('002'))
+        self.assertEqual(group[R('mask')], Resource('bet-002'))
+
+        group[R('desc-brain_T1w')] = Resource('brain-002')
+        self.assertIn(R('sub-002_desc-skullstrip-bet+brain_T1w'), rp)
+        self.assertIn(R('desc-brain_T1w'), group)
+
+    def test_resource_pool_snapshot(self):
+
+        rp = ResourcePool()
+        rp['sub-001_T1w'] = Resource('001')
+        rp['sub-002_T1w'] = Resource('002')
+
+        snapshot = rp.snapshot()
+        self.assertIs(snapshot._pool, rp._pool)
+
+        rp['sub-003_T1w'] = Resource('003')
+        self.assertEqual(len(rp), 3)
+        self.assertEqual(len(snapshot), 2)
+        self.assertNotIn(R('sub-003_T1w'), snapshot)
+        self.assertEqual(len(snapshot[R('sub-*_T1w')]), 2)
+
+        snapshot['sub-004_T1w'] = Resource('004')
+        self.assertEqual(len(snapshot), 3)
+        self.assertNotIn(R('sub-004_T1w'), rp.raw)
+        self.assertEqual(len(rp['T1w']), 3)
+
+    def test_resource_pool_view(self):
+
+        rp = ResourcePool()
+        for sub in ['001', '002']:
+            rp[f'sub-{sub}_T1w'] = Resource(f'T1w-{sub}')
+            rp[f'sub-{sub}_desc-skullstrip-afni_mask'] = Resource(f'mask-{sub}')
+
+        view = rp[R('sub-001_*')]
+        self.assertIs(view._pool, rp._pool)
+        self.assertEqual(len(view), 2)
+        self.assertEqual(dict(view), {
+            R('sub-001_T1w'): Resource('T1w-001'),
+            R('sub-001_desc-skullstrip-afni_mask'): Resource('mask-001'),
+        })
+        self.assertIn(R('T1w'), view)
+        self.assertNotIn(R('sub-002_T1w'), view)
+        self.assertEqual(view[R('mask')], Resource('mask-001'))
+        self.assertEqual(list(view['T1w']), [R('sub-001_T1w')])
+        with self.assertRaises(KeyError):
+            view[R('sub-002_T1w')]
+
+        nested = view[R('sub-*_mask')]
+        self.assertEqual(list(dict(nested)), [R('sub-001_desc-skullstrip-afni_mask')])
+
+        self.assertEqual(len(list(view.extract('T1w', 'mask'))), 1)
+        self.assertIsNot(view._pool, rp._pool)
+
+        view = rp.view('sub-002_*')
+        view['sub-002_desc-brain_T1w'] = Resource('brain-002')
+        self.assertEqual(len(view), 3)
+        self.assertEqual(len(rp), 4)
+        self.assertNotIn(R('sub-002_desc-brain_T1w'), rp.raw)
+
+        # Writes to the pool neither copy it nor show up in its views
+        view = rp.view('sub-001_*')
+        storage = rp._pool
+        rp['sub-001_desc-brain_T1w'] = Resource('brain-001')
+        self.assertIs(rp._pool, storage)
+        self.assertEqual(len(view), 2)
+        self.assertNotIn(R('sub-001_desc-brain_T1w'), view.raw)
+        self.assertEqual(view[R('sub-001_desc-brain_T1w')], Resource('T1w-001'))
+
+    def test_resource_fingerprint(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'sub-001_T1w.nii.gz')
+            with open(path, 'wb') as f:
+                f.write(b'content')
+
+            # Files contribute to the hash, other contents do not
+            self.assertNotEqual(Resource(path).__hashcontent__(), (path,))
+            self.assertEqual(Resource('sub-001_T1w').__hashcontent__(), ('sub-001_T1w',))
+
+            # Relative names are parameters, even if a file has the name
+            cwd = os.getcwd()
+            try:
+                os.chdir(directory)
+                self.assertEqual(Resource('sub-001_T1w.nii.gz').__hashcontent__(), ('sub-001_T1w.nii.gz',))
+            finally:
+                os.chdir(cwd)
+
+            before = hash(Resource(path))
+            os.replace(path, path + '.old')
+            with open(path, 'wb') as f:
+                f.write(b'altered')
+            self.assertNotEqual(hash(Resource(path)), before)
+
+    def test_resource_pool_postings(self):
+
+        rp = ResourcePool()
+        for sub in ['001', '002', '003']:
+            rp[f'sub-{sub}_T1w'] = Resource(f'T1w-{sub}')
+            rp[R('brain', sub=sub, strategy='skullstrip-afni')] = Resource(f'afni-{sub}')
+            rp[R('brain', sub=sub, strategy='skullstrip-bet')] = Resource(f'bet-{sub}')
+
+        # Keys without subject or fork are matched by every subject and fork
+        rp['space-MNI_brain'] = Resource('template')
+        rp['ses-001_T1w'] = Resource('session')
+
+        # The subject index is still used, with the keys without subject
+        self.assertEqual(set(rp._candidates(R('sub-001_brain'))), {
+            R('sub-001_T1w'),
+            R('brain', sub='001', strategy='skullstrip-afni'),
+            R('brain', sub='001', strategy='skullstrip-bet'),
+            R('space-MNI_brain'),
+            R('ses-001_T1w'),
+        })
+
+        filters = [
+            R('sub-001_*'),
+            R('sub-002_brain'),
+            R('sub-003_ses-001_T1w'),
+            R('sub-^_*'),
+            R('brain', sub='001', strategy='skullstrip-afni'),
+            R('brain', strategy='skullstrip-bet'),
+            R('T1w', strategy='nuis-gsr'),
+        ]
+        for key in filters:
+            expected = {k for k, _ in rp if k in key}
+            self.assertEqual(set(rp._select(key)), expected, key)
+            self.assertEqual(key in rp, bool(expected), key)
+
+        for key in [R('sub-002_space-MNI_brain'), R('sub-003_ses-001_T1w')]:
+            best = max((k for k, _ in rp if k in key), key=lambda k: k.sort_key)
+            self.assertEqual(rp[key], rp.raw[best])
+        self.assertEqual(rp[R('brain', sub='002', strategy='skullstrip-bet')], Resource('bet-002'))
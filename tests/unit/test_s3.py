@@ -67,3 +67,17 @@ class S3ClientTestCase(unittest.TestCase):
         s3_from_env = S3Resource('s3://mybucket', tempfile.mkdtemp(), aws_cred_path='env')
         s3_from_file = S3Resource('s3://mybucket', tempfile.mkdtemp(), aws_cred_path=f'{aws_path}/config')
         s3_with_profile = S3Resource('s3://mybucket', tempfile.mkdtemp(), aws_cred_profile='project1')
+
+    def test_hash(self):
+        s3res = S3Resource(f's3://{bucket_name}/sub-001_T1w.nii.gz', tempfile.mkdtemp())
+
+        with mock.patch.object(s3res._client, 'info', return_value={'ETag': '"a"'}):
+            self.assertEqual(s3res.__hashcontent__(), (s3res.content, '"a"'))
+
+        # Failing to reach the object does not change its hash silently
+        with mock.patch.object(s3res._client, 'info', side_effect=PermissionError('Access denied')):
+            with self.assertRaises(PermissionError):
+                s3res.__hashcontent__()
+
+        with mock.patch.object(s3res._client, 'info', side_effect=FileNotFoundError()):
+            self.assertEqual(s3res.__hashcontent__(), (s3res.content,))
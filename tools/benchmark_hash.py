@@ -0,0 +1,71 @@
+"""Compare the streaming deterministic hash with the former repr-based encoder.
+
+Run with `python -m tools.benchmark_hash`.
+"""
+import hashlib
+import timeit
+
+from radiome.core.utils import Hashable, deterministic_hash
+
+
+def _nested_repr(obj):
+    if isinstance(obj, dict):
+        return repr([
+            (_nested_repr(k), _nested_repr(v))
+            for k, v in sorted(obj.items(), key=lambda i: i[0])
+        ])
+
+    if isinstance(obj, (list, tuple)):
+        return repr([_nested_repr(v) for v in obj])
+
+    if isinstance(obj, set):
+        return repr([_nested_repr(v) for v in sorted(list(obj))])
+
+    if isinstance(obj, Hashable):
+        return _nested_repr(obj.__longhash__())
+
+    return repr(obj)
+
+
+def repr_hash(obj):
+    hasher = hashlib.blake2s(digest_size=8)
+    hasher.update(_nested_repr(obj).encode('UTF-8'))
+    return hasher.hexdigest()
+
+
+class Node(Hashable):
+
+    def __init__(self, content):
+        self.content = content
+
+    def __hashcontent__(self):
+        return self.content
+
+
+def workload(depth=200, traits=60):
+    """Build the hash content of a job at the end of a dependency chain,
+    with trait-like inputs and a pickled function. Dependencies are hashed
+    upfront, in topological order, as graph construction does."""
+    function = bytes(range(256)) * 64
+    node = None
+    for i in range(depth):
+        inputs = {
+            f'trait_{t}': [float(t), f'/data/sub-{i:03d}/anat/file_{t}.nii.gz', (t, t + 1, None, True)]
+            for t in range(traits)
+        }
+        inputs['in_file'] = node
+        inputs['args'] = {'-n', '-m', f'-t{i}'}
+        node = Node((f'job_{i}', inputs, function))
+        node.__longhash__()
+    return node.__hashcontent__()
+
+
+def main(number=20):
+    content = workload()
+    for name, func in [('repr', repr_hash), ('streaming', deterministic_hash)]:
+        elapsed = timeit.timeit(lambda: func(content), number=number)
+        print(f'{name:>10}: {elapsed / number * 1000:.2f} ms per hash')
+
+
+if __name__ == '__main__':
+    main()